@@ -277,7 +277,10 @@ class FaceShapeRecommendations:
                 }
             }
         }
-    
+        # Quick tips are assembled from the template above and depend only
+        # on the face shape, so each shape's list is built at most once
+        self._quick_tips_cache: Dict[str, List[str]] = {}
+
     def get_recommendations(self, face_shape: str) -> Dict[str, Any]:
         """
         Get comprehensive recommendations for a specific face shape.
@@ -300,8 +303,12 @@ class FaceShapeRecommendations:
         Returns:
             List of quick styling tips
         """
+        cached = self._quick_tips_cache.get(face_shape)
+        if cached is not None:
+            return cached
+
         recommendations = self.get_recommendations(face_shape)
-        
+
         quick_tips = []
         quick_tips.append(f"Your {face_shape.lower()} face shape: {recommendations['description']}")
         
@@ -312,5 +319,6 @@ class FaceShapeRecommendations:
         # Add key makeup tip
         if 'contouring' in recommendations['makeup']:
             quick_tips.append(f"Makeup tip: {recommendations['makeup']['contouring']}")
-        
+
+        self._quick_tips_cache[face_shape] = quick_tips
         return quick_tips
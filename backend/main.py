@@ -4,6 +4,7 @@ recommendations. This module provides endpoints for image upload, analysis, and
 """
 
 import asyncio
+import hashlib
 import os
 import sqlite3
 import time
@@ -12,8 +13,10 @@ from pathlib import Path
 from typing import Dict, Any, Optional, List
 import json
 import base64
+import orjson
+import random
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import httpx
 import logging
 import aiofiles
@@ -22,8 +25,7 @@ import uuid
 import cv2
 import numpy as np
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, status, Request, Response, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
@@ -51,8 +53,94 @@ OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL_ID = "google/gemini-2.0-flash-exp:free"
 PROMPT_TEXT = """Analyze the facial features in this image and provide:\n1. Face shape (choose one): Oval, Round, Square, Heart, Diamond, Oblong, Triangle\n2. Color season (choose one): \n   - Spring: Light Spring, Warm Spring, Clear Spring\n   - Summer: Light Summer, Cool Summer, Soft Summer\n   - Autumn: Soft Autumn, Warm Autumn, Deep Autumn\n   - Winter: Deep Winter, Cool Winter, Clear Winter\n\nRespond with ONLY two lines:\nLine 1: Face shape\nLine 2: Color season"""
 
-# Create a thread pool for running analysis
-thread_pool = ThreadPoolExecutor(max_workers=4)
+# Cap OpenCV's internal threading so the analysis workers don't oversubscribe
+# the CPU: cv2 otherwise grabs every core per call, and 4 concurrent workers
+# doing that thrash on context switches.
+cv2.setNumThreads(max(1, (os.cpu_count() or 4) // 4))
+
+# Bounded concurrency for analysis work: when every slot is busy, new uploads
+# fail fast with 503 instead of queueing unbounded behind the worker cap
+ANALYSIS_SEM = asyncio.Semaphore(4)
+
+def require_analysis_capacity():
+    """Raise 503 when all analysis slots are in use."""
+    if ANALYSIS_SEM.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is at capacity, please retry shortly"
+        )
+
+# Haar cascade loaded once at import; parsing the XML costs tens of ms per call.
+# Note: cascades aren't picklable, so multiprocessing workers must re-create
+# their own instance in an initializer rather than inheriting this one.
+FACE_CASCADE = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+# Prefer OpenCV's DNN SSD face detector (one forward pass, deterministic
+# latency) when its model files are present; fall back to the Haar cascade.
+FACE_NET_PROTO = Path("models/deploy.prototxt")
+FACE_NET_WEIGHTS = Path("models/res10_300x300_ssd_iter_140000.caffemodel")
+FACE_NET = None
+if FACE_NET_PROTO.exists() and FACE_NET_WEIGHTS.exists():
+    FACE_NET = cv2.dnn.readNetFromCaffe(str(FACE_NET_PROTO), str(FACE_NET_WEIGHTS))
+    FACE_NET.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    FACE_NET.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+def detect_faces(img: np.ndarray) -> list:
+    """Detect faces as (x, y, w, h) boxes with the DNN detector or Haar fallback."""
+    if FACE_NET is not None:
+        h, w = img.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(img, (300, 300)), 1.0, (300, 300), (104, 177, 123)
+        )
+        FACE_NET.setInput(blob)
+        detections = FACE_NET.forward()
+        faces = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < 0.5:
+                continue
+            x1, y1, x2, y2 = (detections[0, 0, i, 3:7] * np.array([w, h, w, h])).astype(int)
+            faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+
+    # UMat lets the T-API dispatch the conversion + cascade to OpenCL
+    # where available; on plain CPUs it behaves like a regular Mat
+    gray = cv2.cvtColor(cv2.UMat(img), cv2.COLOR_BGR2GRAY)
+    return list(FACE_CASCADE.detectMultiScale(gray, 1.3, 5))
+
+# Batched database writes: pending result rows are coalesced by a background
+# flusher so concurrent uploads share one fsync instead of paying one each.
+DB_FLUSH_INTERVAL = 0.05  # seconds
+DB_FLUSH_MAX_ROWS = 50
+# SQL statements as module constants: sqlite3 caches prepared statements per
+# connection keyed on the text, so reusing the same strings skips re-parsing.
+INSERT_RESULT_SQL = (
+    "INSERT OR REPLACE INTO analysis_results "
+    "(id, status, face_shape, color_season, error_detail, content_hash) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SQL_SELECT_RESULT = (
+    "SELECT status, face_shape, color_season, error_detail "
+    "FROM analysis_results WHERE id = ?"
+)
+SQL_SELECT_BY_HASH = (
+    "SELECT id, face_shape, color_season FROM analysis_results "
+    "WHERE content_hash = ? AND status = 'completed'"
+)
+db_write_queue: Optional[asyncio.Queue] = None
+
+# Shared async HTTP client with HTTP/2 keep-alive for OpenRouter calls
+httpx_client: Optional[httpx.AsyncClient] = None
+
+def get_httpx_client() -> httpx.AsyncClient:
+    """Return the shared async HTTP client, creating it if needed."""
+    global httpx_client
+    if httpx_client is None:
+        httpx_client = httpx.AsyncClient(
+            http2=True,
+            timeout=ANALYSIS_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=16)
+        )
+    return httpx_client
 
 # Store analysis results
 analysis_results: Dict[str, dict] = {}
@@ -73,10 +161,18 @@ class AnalysisResult(BaseModel):
     error_detail: Optional[str] = None
     progress: Optional[float] = None
 
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson, 2-5x faster than stdlib json."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
 app = FastAPI(
     title="Chromalyze",
     description="Chromalyze API for personal color and face shape analysis based on images.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware configuration
@@ -103,178 +199,354 @@ def init_db():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # content_hash lets duplicate uploads short-circuit to the cached result
+    try:
+        c.execute("ALTER TABLE analysis_results ADD COLUMN content_hash TEXT")
+    except sqlite3.OperationalError:
+        pass  # column already exists
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_content_hash ON analysis_results(content_hash)"
+    )
+    # Cleanup and status scans filter on status
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_status ON analysis_results(status)"
+    )
     conn.commit()
     conn.close()
 
-def analyze_image(file_path: str) -> dict:
-    """Analyze image using OpenRouter Gemini Vision API with local fallback."""
-    retries = 0
-    last_error = None
-    
-    # First try OpenRouter API
-    while retries < MAX_RETRIES:
+def get_db() -> sqlite3.Connection:
+    """Return the shared long-lived database connection, creating it if needed."""
+    db = getattr(app.state, "db", None)
+    if db is None:
+        db = sqlite3.connect(DATABASE, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA temp_store=MEMORY")
+        app.state.db = db
+    return db
+
+def queue_insert(row: tuple) -> None:
+    """Queue a result row for the batch flusher, writing directly if it isn't running."""
+    if db_write_queue is not None:
+        db_write_queue.put_nowait(row)
+    else:
+        get_db().execute(INSERT_RESULT_SQL, row)
+
+async def flush_db_writes():
+    """Drain queued result rows and insert them in batched transactions."""
+    db = get_db()
+    while True:
+        rows = [await db_write_queue.get()]
+        deadline = time.monotonic() + DB_FLUSH_INTERVAL
         try:
-            # Read and encode image
-            with open(file_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "HTTP-Referer": "https://github.com/xxshi/face-bs",
-                "X-Title": "Chromalyze"
-            }
-
-            payload = {
-                "model": MODEL_ID,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": PROMPT_TEXT},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
-                        ]
-                    }
+            while len(rows) < DB_FLUSH_MAX_ROWS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(db_write_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Shutdown cancelled us mid-batch: the rows already popped into
+            # this batch aren't in the queue anymore, so put them back for
+            # the shutdown drain to commit instead of silently losing them
+            for row in rows:
+                db_write_queue.put_nowait(row)
+            raise
+        # One failed batch must not kill the flusher: roll back, log,
+        # and keep draining — otherwise every later queue_insert would
+        # enqueue rows that are never written
+        try:
+            db.execute("BEGIN")
+            db.executemany(INSERT_RESULT_SQL, rows)
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                db.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            logger.error(f"Failed to flush {len(rows)} result rows: {e}")
+
+def _drain_db_queue(db: sqlite3.Connection) -> None:
+    """Write any rows still queued; called on shutdown before closing."""
+    if db_write_queue is None:
+        return
+    rows = []
+    while not db_write_queue.empty():
+        rows.append(db_write_queue.get_nowait())
+    if rows:
+        try:
+            db.execute("BEGIN")
+            db.executemany(INSERT_RESULT_SQL, rows)
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                db.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            logger.error(f"Failed to drain {len(rows)} result rows at shutdown: {e}")
+
+async def call_openrouter(file_path: str) -> Optional[dict]:
+    """Call the OpenRouter vision API, retrying with exponential backoff and jitter.
+
+    Returns the parsed result, or None (raising nothing) once retries are exhausted
+    so the caller can fall back to local analysis.
+    """
+    client = get_httpx_client()
+
+    # Read and encode once; the bytes don't change between retries. readinto
+    # plus a memoryview keeps the multi-MB JPEG from being copied through an
+    # extra intermediate bytes object before encoding.
+    data = bytearray(os.path.getsize(file_path))
+    with open(file_path, "rb") as image_file:
+        image_file.readinto(data)
+    image_data = base64.b64encode(memoryview(data)).decode('ascii')
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "https://github.com/xxshi/face-bs",
+        "X-Title": "Chromalyze"
+    }
+
+    payload = {
+        "model": MODEL_ID,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": PROMPT_TEXT},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
                 ]
             }
+        ]
+    }
 
-            try:
-                response = requests.post(
-                    OPENROUTER_API_URL,
-                    headers=headers,
-                    json=payload,
-                    timeout=ANALYSIS_TIMEOUT
-                )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if "choices" in result and result["choices"]:
-                        analysis_text = result["choices"][0]["message"]["content"]
-                        lines = analysis_text.strip().split('\n')
-                        if len(lines) >= 2:
-                            return {
-                                "face_shape": lines[0].strip(),
-                                "color_season": lines[1].strip()
-                            }
-            except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-                last_error = str(e)
-                retries += 1
-                if retries < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY * (retries + 1))
-                    continue
-                break
-
-        except Exception as e:
-            last_error = str(e)
-            retries += 1
-            if retries < MAX_RETRIES:
-                time.sleep(RETRY_DELAY * (retries + 1))
-                continue
-            break
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
+
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                if "choices" in result and result["choices"]:
+                    analysis_text = result["choices"][0]["message"]["content"]
+                    lines = analysis_text.strip().split('\n')
+                    if len(lines) >= 2:
+                        return {
+                            "face_shape": lines[0].strip(),
+                            "color_season": lines[1].strip()
+                        }
+
+        except (httpx.HTTPError, json.JSONDecodeError, OSError) as e:
+            logger.warning(f"OpenRouter attempt {attempt + 1} failed: {e}")
+
+        if attempt < MAX_RETRIES - 1:
+            # Exponential backoff with jitter, capped at 30s, to avoid retry storms
+            delay = min(30.0, RETRY_DELAY * 2 ** attempt * (1 + random.random() * 0.5))
+            await asyncio.sleep(delay)
+
+    return None
+
+# Season lookup indexed by (warm, bright, high-chroma) bins so classification
+# is a table hit instead of per-pixel branching
+SEASON_TABLE = {
+    (True, True, True): "Clear Spring",
+    (True, True, False): "Light Spring",
+    (True, False, True): "Warm Autumn",
+    (True, False, False): "Soft Autumn",
+    (False, True, True): "Clear Winter",
+    (False, True, False): "Light Summer",
+    (False, False, True): "Deep Winter",
+    (False, False, False): "Cool Summer",
+}
+
+@lru_cache(maxsize=64)
+def normalize_season(color_season: str) -> str:
+    """Normalize a raw season string ('warm_autumn' -> 'Warm Autumn'), cached."""
+    return color_season.replace('_', ' ').title()
+
+@lru_cache(maxsize=64)
+def cached_palette(season_name: str) -> Optional[dict]:
+    """Cached palette lookup for hot request paths."""
+    return get_palette(season_name)
+
+# Palette responses serialized once at import; the endpoint returns these
+# bytes directly instead of re-serializing the same dict per request
+PALETTE_JSON = {
+    season: orjson.dumps({"season": season, "palette": palette})
+    for season, palette in COLOR_PALETTES.items()
+}
+
+def classify_color_season(face_roi: np.ndarray) -> str:
+    """Classify a color season from single-pass statistics over the face ROI."""
+    roi = face_roi.reshape(-1, 3).astype(np.float32)
+    mean = roi.mean(axis=0)  # BGR channel means
+    std = roi.std(axis=0)
+    hsv = cv2.cvtColor(face_roi, cv2.COLOR_BGR2HSV)
+    hue_mean = float(hsv[..., 0].mean())
+
+    # OpenCV hue is 0-179; reds/yellows sit below ~45
+    warm = mean[2] > mean[0] or hue_mean < 45
+    bright = float(mean.mean()) > 140
+    chromatic = float(std.mean()) > 35
+    return SEASON_TABLE[(warm, bright, chromatic)]
+
+@lru_cache(maxsize=256)
+def _detect_and_measure(file_path: str, mtime: float) -> Optional[tuple]:
+    """Detect the primary face and measure its ROI, cached per (path, mtime).
+
+    Retried or duplicate analyses of the same file skip the decode +
+    detection + color scan entirely. Returns (aspect_ratio, color_season)
+    or None when no face is found.
+    """
+    img = cv2.imread(file_path)
+    if img is None:
+        raise Exception("Failed to load image")
+
+    faces = detect_faces(img)
+    if len(faces) == 0:
+        return None
 
-    # If OpenRouter fails, use local analysis
-    try:
-        logger.info("Falling back to local analysis")
-        # Use OpenCV for basic face detection
-        img = cv2.imread(file_path)
-        if img is None:
-            raise Exception("Failed to load image")
-
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        if len(faces) == 0:
-            return {
-                "face_shape": "Unknown",
-                "color_season": "Unknown",
-                "error": "No face detected in image"
-            }
+    x, y, w, h = faces[0]
+    aspect_ratio = w / float(h)
+    color_season = classify_color_season(img[y:y+h, x:x+w])
+    return aspect_ratio, color_season
 
-        # Basic face shape analysis based on face rectangle
-        x, y, w, h = faces[0]
-        aspect_ratio = w / float(h)
-        
-        # Simple face shape classification based on aspect ratio
-        if aspect_ratio > 0.85:
-            face_shape = "Round"
-        elif aspect_ratio > 0.75:
-            face_shape = "Oval"
-        else:
-            face_shape = "Oblong"
-
-        # Basic color analysis
-        face_roi = img[y:y+h, x:x+w]
-        avg_color = np.mean(face_roi, axis=(0,1))
-        
-        # Simple color season classification
-        if avg_color[2] > avg_color[1] and avg_color[2] > avg_color[0]:
-            color_season = "Warm Autumn"
-        else:
-            color_season = "Cool Summer"
+def local_analysis(file_path: str) -> dict:
+    """Analyze the image locally with OpenCV face detection."""
+    measured = _detect_and_measure(file_path, os.path.getmtime(file_path))
 
+    if measured is None:
         return {
-            "face_shape": face_shape,
-            "color_season": color_season,
-            "note": "Results from local analysis"
+            "face_shape": "Unknown",
+            "color_season": "Unknown",
+            "error": "No face detected in image"
         }
 
+    aspect_ratio, color_season = measured
+
+    # Simple face shape classification based on aspect ratio
+    if aspect_ratio > 0.85:
+        face_shape = "Round"
+    elif aspect_ratio > 0.75:
+        face_shape = "Oval"
+    else:
+        face_shape = "Oblong"
+
+    return {
+        "face_shape": face_shape,
+        "color_season": color_season,
+        "note": "Results from local analysis"
+    }
+
+async def analyze_image(file_path: str) -> dict:
+    """Analyze image using OpenRouter Gemini Vision API with local fallback."""
+    # First try OpenRouter API
+    result = await call_openrouter(file_path)
+    if result is not None:
+        return result
+
+    # If OpenRouter fails, use local analysis on a worker thread
+    try:
+        logger.info("Falling back to local analysis")
+        return await asyncio.to_thread(local_analysis, file_path)
     except Exception as e:
         logger.error(f"Local analysis failed: {str(e)}")
-        raise Exception(f"Both API and local analysis failed. Last error: {last_error}")
-
-def run_analysis(analysis_id: str, file_path_str: str):
-    """Run analysis on the uploaded image."""
+        raise Exception(f"Both API and local analysis failed. Last error: {str(e)}")
+
+async def run_pipeline(analysis_id: str, file_path: str, content_hash: Optional[str] = None) -> dict:
+    """Run the full analysis pipeline for one upload.
+
+    The single code path shared by every upload route: tracks progress in
+    the in-memory status store, persists the outcome through the batched
+    DB writer, and surfaces timeouts as 504s.
+    """
+    await save_analysis_status(analysis_id, {
+        "status": "processing",
+        "progress": 0,
+        "start_time": time.time()
+    })
     try:
-        # Initialize database connection
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # Update status to processing
-        cursor.execute(
-            "UPDATE analysis_results SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            ("processing", analysis_id)
-        )
-        conn.commit()
-        
-        # Run analysis
-        result = analyze_image(file_path_str)
-        
-        # Update database with results
-        cursor.execute(
-            """
-            UPDATE analysis_results 
-            SET status = ?, 
-                face_shape = ?, 
-                color_season = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """,
-            ("completed", result.get("face_shape"), result.get("color_season"), analysis_id)
-        )
-        conn.commit()
-        
+        async with ANALYSIS_SEM:
+            result = await asyncio.wait_for(
+                analyze_image(file_path),
+                timeout=ANALYSIS_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        logger.error("Analysis timed out")
+        await save_analysis_status(analysis_id, {
+            "status": "error",
+            "error_detail": "Analysis timed out",
+            "end_time": time.time()
+        })
+        queue_insert((analysis_id, "error", None, None, "Analysis timed out", content_hash))
+        raise HTTPException(status_code=504, detail="Analysis timed out")
     except Exception as e:
-        print(f"Error during analysis: {e}")
-        # Update status to error
-        cursor.execute(
-            "UPDATE analysis_results SET status = ?, error_detail = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            ("error", str(e), analysis_id)
-        )
-        conn.commit()
-    finally:
-        if conn:
-            conn.close()
+        logger.error(f"Analysis error: {str(e)}")
+        await save_analysis_status(analysis_id, {
+            "status": "error",
+            "error_detail": str(e),
+            "end_time": time.time()
+        })
+        queue_insert((analysis_id, "error", None, None, str(e), content_hash))
+        raise
+
+    await save_analysis_status(analysis_id, {
+        "status": "completed",
+        "progress": 100,
+        "result": result,
+        "end_time": time.time()
+    })
+    queue_insert((
+        analysis_id,
+        "completed",
+        result.get("face_shape", "Unknown"),
+        result.get("color_season", "Unknown"),
+        result.get("detail", None),
+        content_hash
+    ))
+    return result
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
+    """Initialize the database and start the batch write flusher."""
+    global db_write_queue
+    logger.info(f"OpenCL available for cv2: {cv2.ocl.haveOpenCL()}")
     init_db()
+    get_db()
+    db_write_queue = asyncio.Queue()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    # Hold references so the tasks aren't garbage-collected mid-run and
+    # can be cancelled cleanly on shutdown
+    app.state.flusher_tasks = [
+        asyncio.create_task(flush_db_writes()),
+        asyncio.create_task(flush_status_files()),
+    ]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the flushers, drain pending writes, and close shared resources."""
+    tasks = getattr(app.state, "flusher_tasks", [])
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    db = getattr(app.state, "db", None)
+    if db is not None:
+        # Rows enqueued just before shutdown must still reach the DB
+        _drain_db_queue(db)
+        db.execute("PRAGMA optimize")
+        db.close()
+        app.state.db = None
+    if httpx_client is not None:
+        await httpx_client.aclose()
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
+@app.post("/upload")
+async def upload_file(file: UploadFile = File(...)) -> ORJSONResponse:
     """Upload and analyze an image file."""
+    require_analysis_capacity()
     try:
         # Create a unique ID for this analysis
         analysis_id = str(uuid.uuid4())
@@ -282,38 +554,36 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
         # Create uploads directory if it doesn't exist
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         
-        # Save the uploaded file
+        # Save the uploaded file in chunks, hashing as we write so large
+        # bodies never sit in memory and duplicate uploads can be detected
         file_path = os.path.join(UPLOAD_DIR, f"{analysis_id}.jpg")
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Run analysis immediately
-        result = analyze_image(file_path)
-        
-        # Save to database
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO analysis_results (id, status, face_shape, color_season, error_detail) VALUES (?, ?, ?, ?, ?)",
-            (
-                analysis_id,
-                "completed",
-                result.get("face_shape", "Unknown"),
-                result.get("color_season", "Unknown"),
-                result.get("detail", None)
-            )
-        )
-        conn.commit()
-        conn.close()
-        
-        # Return results immediately
-        return JSONResponse(content={
+        hasher = hashlib.sha256()
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(1 << 20):
+                hasher.update(chunk)
+                await buffer.write(chunk)
+        content_hash = hasher.hexdigest()
+
+        # Duplicate upload: return the cached analysis instead of re-running
+        cached = get_db().execute(SQL_SELECT_BY_HASH, (content_hash,)).fetchone()
+        if cached:
+            return ORJSONResponse(content={
+                "analysis_id": cached[0],
+                "status": "completed",
+                "result": {"face_shape": cached[1], "color_season": cached[2]}
+            })
+
+        # Run the shared analysis pipeline and return results immediately
+        result = await run_pipeline(analysis_id, file_path, content_hash)
+
+        return ORJSONResponse(content={
             "analysis_id": analysis_id,
             "status": "completed",
             "result": result
         })
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload: {str(e)}")
         raise HTTPException(
@@ -322,18 +592,11 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
         )
 
 @app.get("/api/results/{analysis_id}")
-async def get_results(analysis_id: str) -> JSONResponse:
+async def get_results(analysis_id: str) -> ORJSONResponse:
     """Get analysis results."""
     try:
-        # Get from database
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT status, face_shape, color_season, error_detail FROM analysis_results WHERE id = ?",
-            (analysis_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        # Get from the shared connection so the prepared statement is reused
+        result = get_db().execute(SQL_SELECT_RESULT, (analysis_id,)).fetchone()
         
         if not result:
             raise HTTPException(
@@ -347,8 +610,7 @@ async def get_results(analysis_id: str) -> JSONResponse:
         palette_data = None
         if status_value == "completed" and color_season and color_season != "Unknown":
             try:
-                normalized_season = color_season.replace('_', ' ').title()
-                palette_data = get_palette(normalized_season)
+                palette_data = cached_palette(normalize_season(color_season))
             except Exception as e:
                 logger.warning(f"Could not get palette for {color_season}: {e}")
 
@@ -362,7 +624,7 @@ async def get_results(analysis_id: str) -> JSONResponse:
         if palette_data:
             result_data["palette"] = palette_data
 
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "status": status_value,
             "result": result_data
         })
@@ -377,30 +639,27 @@ async def get_results(analysis_id: str) -> JSONResponse:
         )
 
 @app.get("/api/health")
-async def health_check() -> JSONResponse:
+@app.get("/health")
+async def health_check() -> ORJSONResponse:
     """Health check endpoint."""
-    return JSONResponse(content={"status": "healthy"})
+    return ORJSONResponse(content={"status": "healthy"})
 
 @app.get("/api/palette/{color_season}")
-async def get_color_palette(color_season: str) -> JSONResponse:
+async def get_color_palette(color_season: str) -> ORJSONResponse:
     """Get detailed color palette for a specific color season."""
     try:
         # Normalize the color season name
-        normalized_season = color_season.replace('_', ' ').title()
-
-        # Get palette from color_palettes.py
-        palette = get_palette(normalized_season)
+        normalized_season = normalize_season(color_season)
 
-        if not palette:
+        # Serve the pre-serialized palette bytes directly
+        body = PALETTE_JSON.get(normalized_season)
+        if body is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Color season '{normalized_season}' not found"
             )
 
-        return JSONResponse(content={
-            "season": normalized_season,
-            "palette": palette
-        })
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
@@ -411,181 +670,48 @@ async def get_color_palette(color_season: str) -> JSONResponse:
             detail=str(e)
         )
 
-async def save_analysis_status(analysis_id: str, status: dict):
-    """Save analysis status to disk"""
+# Status updates are kept authoritative in the in-memory analysis_status dict;
+# only dirty entries are flushed to disk periodically, and terminal states are
+# written through immediately so recovery still works.
+STATUS_FLUSH_INTERVAL = 2.0  # seconds
+_dirty_status: set = set()
+
+async def _write_status_file(analysis_id: str):
+    """Persist one in-memory status entry to its JSON file."""
     status_file = os.path.join(RESULTS_DIR, f"{analysis_id}.json")
     async with aiofiles.open(status_file, 'w') as f:
-        await f.write(json.dumps(status))
+        await f.write(orjson.dumps(analysis_status[analysis_id]).decode())
+
+async def save_analysis_status(analysis_id: str, status: dict):
+    """Record analysis status; terminal states are flushed to disk at once."""
+    analysis_status[analysis_id] = status
+    if status.get("status") in ("completed", "error"):
+        _dirty_status.discard(analysis_id)
+        await _write_status_file(analysis_id)
+    else:
+        _dirty_status.add(analysis_id)
+
+async def flush_status_files():
+    """Periodically persist dirty in-memory statuses to disk."""
+    while True:
+        await asyncio.sleep(STATUS_FLUSH_INTERVAL)
+        for analysis_id in list(_dirty_status):
+            _dirty_status.discard(analysis_id)
+            try:
+                await _write_status_file(analysis_id)
+            except Exception as e:
+                logger.error(f"Error flushing status for {analysis_id}: {e}")
 
 async def load_analysis_status(analysis_id: str) -> Optional[dict]:
-    """Load analysis status from disk"""
+    """Load analysis status from memory, falling back to disk."""
+    if analysis_id in analysis_status:
+        return analysis_status[analysis_id]
     status_file = os.path.join(RESULTS_DIR, f"{analysis_id}.json")
     try:
         async with aiofiles.open(status_file, 'r') as f:
-            return json.loads(await f.read())
+            return orjson.loads(await f.read())
     except:
         return None
 
-async def analyze_face(file_path: str, analysis_id: str):
-    """Analyze face using the API with retries and progress tracking"""
-    try:
-        # Initialize status
-        status = {
-            "status": "processing",
-            "result": None,
-            "error_detail": None,
-            "progress": 0,
-            "start_time": time.time(),
-            "last_update": time.time()
-        }
-        analysis_status[analysis_id] = status
-        await save_analysis_status(analysis_id, status)
-
-        # Run analysis in thread pool to avoid blocking
-        def run_analysis():
-            try:
-                result = analyze_image(file_path)
-                return result
-            except Exception as e:
-                logger.error(f"Analysis error: {str(e)}")
-                raise
-
-        # Update progress to 30% for starting analysis
-        status["progress"] = 30
-        status["last_update"] = time.time()
-        await save_analysis_status(analysis_id, status)
-
-        # Run analysis with timeout
-        loop = asyncio.get_event_loop()
-        try:
-            result = await asyncio.wait_for(
-                loop.run_in_executor(thread_pool, run_analysis),
-                timeout=ANALYSIS_TIMEOUT
-            )
-            
-            # Update progress to 100% for completed analysis
-            status.update({
-                "status": "completed",
-                "result": result,
-                "progress": 100,
-                "end_time": time.time()
-            })
-            await save_analysis_status(analysis_id, status)
-            
-        except asyncio.TimeoutError:
-            logger.error("Analysis timed out")
-            status.update({
-                "status": "error",
-                "error_detail": "Analysis timed out",
-                "end_time": time.time()
-            })
-            await save_analysis_status(analysis_id, status)
-            raise HTTPException(
-                status_code=504,
-                detail="Analysis timed out"
-            )
-
-    except Exception as e:
-        logger.error(f"Analysis error: {str(e)}")
-        status.update({
-            "status": "error",
-            "error_detail": str(e),
-            "end_time": time.time()
-        })
-        await save_analysis_status(analysis_id, status)
-    finally:
-        # Clean up the uploaded file
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.error(f"Error cleaning up file {file_path}: {str(e)}")
-
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
-    """Upload a file and start analysis"""
-    try:
-        # Generate a unique ID for this analysis
-        analysis_id = f"{int(time.time())}_{file.filename}"
-        
-        # Save the file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Start analysis in background
-        if background_tasks:
-            background_tasks.add_task(analyze_face, file_path, analysis_id)
-        else:
-            asyncio.create_task(analyze_face(file_path, analysis_id))
-        
-        return {"analysis_id": analysis_id, "status": "processing"}
-    except Exception as e:
-        logger.error(f"Upload error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
-
-async def process_image(file_path: str, analysis_id: str):
-    """Process an uploaded image."""
-    try:
-        # Update status to processing
-        status = {
-            "status": "processing",
-            "start_time": time.time(),
-            "progress": 0
-        }
-        await save_analysis_status(analysis_id, status)
-        
-        # Run analysis
-        result = analyze_image(file_path)
-        
-        # Update status with results
-        status = {
-            "status": "completed",
-            "progress": 100,
-            "result": result
-        }
-        await save_analysis_status(analysis_id, status)
-        
-        # Save to database
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO analysis_results (id, status, face_shape, color_season, error_detail) VALUES (?, ?, ?, ?, ?)",
-            (
-                analysis_id,
-                "completed",
-                result.get("face_shape", "Unknown"),
-                result.get("color_season", "Unknown"),
-                result.get("detail", None)
-            )
-        )
-        conn.commit()
-        conn.close()
-        
-    except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
-        # Update status with error
-        status = {
-            "status": "error",
-            "progress": 100,
-            "error_detail": str(e)
-        }
-        await save_analysis_status(analysis_id, status)
-        
-        # Save error to database
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO analysis_results (id, status, error_detail) VALUES (?, ?, ?)",
-            (analysis_id, "error", str(e))
-        )
-        conn.commit()
-        conn.close()
-
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -2,23 +2,59 @@
 Data loading and preprocessing for face shape classification.
 """
 
+import hashlib
 import os
 import numpy as np
 import cv2
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Tuple, Generator, List
+from typing import Optional, Tuple, Generator, List
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.utils import to_categorical
 from sklearn.model_selection import train_test_split
 import albumentations as A
 from .model_config import ModelConfig
 
+# ImageNet normalization stats, matching the albumentations pipelines below
+# and the in-model Normalization layer in FaceShapeCNN.build_model
+IMAGENET_MEAN = tf.constant([0.485, 0.456, 0.406])
+IMAGENET_STD = tf.constant([0.229, 0.224, 0.225])
+
+# Per-process loader for dataset workers. The Haar cascade and albumentations
+# pipelines aren't picklable, so each worker process builds its own copy in
+# the pool initializer instead of inheriting one from the parent.
+_worker_loader: Optional["FaceShapeDataLoader"] = None
+
+def _worker_init(config: ModelConfig):
+    """Initialize per-process state for dataset loading workers."""
+    global _worker_loader
+    _worker_loader = FaceShapeDataLoader(config)
+
+def _load_one(job: Tuple[str, int, bool]) -> Tuple[np.ndarray, int]:
+    """Load and preprocess a single (path, label, is_training) job in a worker."""
+    img_path, class_idx, is_training = job
+    image = _worker_loader.load_image(img_path, is_training=is_training)
+    return image, class_idx
+
 class FaceShapeDataLoader:
     """Data loader for face shape classification with augmentation."""
     
     def __init__(self, config: ModelConfig = None):
         self.config = config or ModelConfig()
+        # Load the Haar cascade once per loader instead of once per image.
+        # Cascades aren't picklable, so multiprocessing workers must build
+        # their own in a process initializer.
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        # DNN SSD detector runs one forward pass per image instead of the
+        # cascade's multi-scale sliding window; used when its files exist
+        self.face_net = None
+        proto = Path("models/deploy.prototxt")
+        weights = Path("models/res10_300x300_ssd_iter_140000.caffemodel")
+        if proto.exists() and weights.exists():
+            self.face_net = cv2.dnn.readNetFromCaffe(str(proto), str(weights))
+            self.face_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.face_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
         self.class_to_idx = {name: idx for idx, name in enumerate(self.config.CLASS_NAMES)}
         self.idx_to_class = {idx: name for name, idx in self.class_to_idx.items()}
         
@@ -49,54 +85,89 @@ class FaceShapeDataLoader:
             A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         ])
     
-    def preprocess_image(self, image: np.ndarray, is_training: bool = True) -> np.ndarray:
-        """Enhanced image preprocessing with face detection and alignment."""
-        # Convert to RGB if needed
+    def _detect_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Detect faces as (x, y, w, h) boxes, preferring the DNN detector."""
+        if self.face_net is not None:
+            h, w = image.shape[:2]
+            blob = cv2.dnn.blobFromImage(
+                cv2.resize(image, (300, 300)), 1.0, (300, 300), (104, 177, 123)
+            )
+            self.face_net.setInput(blob)
+            detections = self.face_net.forward()
+            faces = []
+            for i in range(detections.shape[2]):
+                if detections[0, 0, i, 2] < 0.5:
+                    continue
+                x1, y1, x2, y2 = (detections[0, 0, i, 3:7] * np.array([w, h, w, h])).astype(int)
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+            return faces
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return list(self.face_cascade.detectMultiScale(gray, 1.1, 4))
+
+    def _crop_largest_face(self, image: np.ndarray) -> np.ndarray:
+        """Crop the largest detected face with margin and resize to model input.
+
+        Expects a BGR image straight from cv2 decode; the BGR->RGB conversion
+        is deferred until after the face crop so only the ROI pixels are
+        converted instead of the full frame. Returns an RGB uint8 crop, or a
+        whole-image resize when no face is detected.
+        """
+        # Normalize to 3-channel BGR if needed
         if len(image.shape) == 2:
-            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
         elif image.shape[2] == 4:
-            image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-        
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
         # Apply face detection and alignment
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
+        faces = self._detect_faces(image)
+
         if len(faces) > 0:
             # Get the largest face
             face = max(faces, key=lambda x: x[2] * x[3])
             x, y, w, h = face
-            
+
             # Add margin around face
             margin = int(max(w, h) * 0.2)
             x1 = max(0, x - margin)
             y1 = max(0, y - margin)
             x2 = min(image.shape[1], x + w + margin)
             y2 = min(image.shape[0], y + h + margin)
-            
-            # Crop and resize
+
+            # Crop and resize; INTER_AREA averages source pixels, which is
+            # both faster and cleaner than INTER_LINEAR when shrinking
             face_img = image[y1:y2, x1:x2]
-            face_img = cv2.resize(face_img, (self.config.IMG_WIDTH, self.config.IMG_HEIGHT))
+            face_img = cv2.resize(face_img, (self.config.IMG_WIDTH, self.config.IMG_HEIGHT),
+                                  interpolation=cv2.INTER_AREA)
         else:
             # If no face detected, resize the whole image
-            face_img = cv2.resize(image, (self.config.IMG_WIDTH, self.config.IMG_HEIGHT))
-        
+            face_img = cv2.resize(image, (self.config.IMG_WIDTH, self.config.IMG_HEIGHT),
+                                  interpolation=cv2.INTER_AREA)
+
+        # Convert only the resized crop, not the full frame
+        return cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+
+    def preprocess_image(self, image: np.ndarray, is_training: bool = True) -> np.ndarray:
+        """Enhanced image preprocessing with face detection and alignment."""
+        face_img = self._crop_largest_face(image)
+
         # Apply transformations
         transform = self.train_transform if is_training else self.val_transform
         transformed = transform(image=face_img)
         return transformed['image']
-    
+
     def load_image(self, image_path: str, is_training: bool = True) -> np.ndarray:
         """Load and preprocess a single image with enhanced error handling."""
         try:
-            image = cv2.imread(image_path)
+            # Decode from in-memory bytes; imdecode avoids imread's extra
+            # filename round-trip and always yields 3-channel BGR here
+            with open(image_path, 'rb') as f:
+                buffer = np.frombuffer(f.read(), dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
             if image is None:
                 raise ValueError(f"Could not load image: {image_path}")
-            
-            # Convert BGR to RGB
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Apply preprocessing
+
+            # Apply preprocessing (BGR in, RGB conversion happens post-crop)
             return self.preprocess_image(image, is_training)
         except Exception as e:
             print(f"Error processing image {image_path}: {str(e)}")
@@ -104,81 +175,198 @@ class FaceShapeDataLoader:
             return np.zeros((self.config.IMG_HEIGHT, self.config.IMG_WIDTH, 3))
     
     def load_dataset(self, data_dir: Path, use_augmentation: bool = True) -> Tuple[np.ndarray, np.ndarray, List[str]]:
-        """Load dataset with enhanced error handling and augmentation."""
-        images = []
-        labels = []
-        image_paths = []
-        
+        """Load dataset in parallel across a process pool."""
+        # First pass: collect (path, label) jobs only
+        jobs: List[Tuple[str, int, bool]] = []
         for class_name in self.config.CLASS_NAMES:
             class_dir = data_dir / class_name
             if not class_dir.exists():
                 print(f"Warning: Class directory not found: {class_dir}")
                 continue
-            
+
             class_idx = self.class_to_idx[class_name]
             for img_path in class_dir.glob('*'):
                 if img_path.suffix.lower() not in ['.jpg', '.jpeg', '.png']:
                     continue
-                
-                try:
-                    image = self.load_image(str(img_path), is_training=use_augmentation)
-                    if image is not None and not np.all(image == 0):
-                        images.append(image)
-                        labels.append(class_idx)
-                        image_paths.append(str(img_path))
-                except Exception as e:
-                    print(f"Error loading {img_path}: {str(e)}")
+                jobs.append((str(img_path), class_idx, use_augmentation))
+
+        if not jobs:
+            raise ValueError(f"No valid images found in {data_dir}")
+
+        # Preallocate the output arrays and write by index so the full-size
+        # np.array(list) copy at the end is never made
+        images = np.empty(
+            (len(jobs), self.config.IMG_HEIGHT, self.config.IMG_WIDTH, 3),
+            dtype=np.float16
+        )
+        labels = np.empty(len(jobs), dtype=np.int32)
+        image_paths: List[str] = []
+
+        count = 0
+        with ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=_worker_init,
+            initargs=(self.config,)
+        ) as executor:
+            for job, (image, class_idx) in zip(jobs, executor.map(_load_one, jobs, chunksize=32)):
+                if image is None or np.all(image == 0):
                     continue
-        
-        if not images:
+                images[count] = image
+                labels[count] = class_idx
+                image_paths.append(job[0])
+                count += 1
+
+        if count == 0:
             raise ValueError(f"No valid images found in {data_dir}")
-        
-        return np.array(images), np.array(labels), image_paths
+
+        return images[:count], labels[:count], image_paths
     
+    def list_image_paths(self, data_dir: Path) -> Tuple[List[str], List[int]]:
+        """Collect image paths and integer labels without decoding anything."""
+        paths: List[str] = []
+        labels: List[int] = []
+        for class_name in self.config.CLASS_NAMES:
+            class_dir = data_dir / class_name
+            if not class_dir.exists():
+                print(f"Warning: Class directory not found: {class_dir}")
+                continue
+
+            class_idx = self.class_to_idx[class_name]
+            for img_path in class_dir.glob('*'):
+                if img_path.suffix.lower() in ['.jpg', '.jpeg', '.png']:
+                    paths.append(str(img_path))
+                    labels.append(class_idx)
+
+        if not paths:
+            raise ValueError(f"No images found in {data_dir}")
+        return paths, labels
+
+    def _finalize_example(self, image: tf.Tensor, label: tf.Tensor, is_training: bool):
+        """Cast the image down and one-hot encode the label.
+
+        Expects a float32 image in [0, 1] already resized to the model input
+        size. Batches leave here un-augmented and un-normalized on purpose:
+        both run inside the model as GPU-side layers, and ImageNet
+        standardization has to happen after the brightness/contrast jitter,
+        which only makes sense on real [0, 1] pixel values.
+        """
+        # Half-width tensors double pipeline bandwidth; the classifier
+        # head stays FP32 under the mixed-precision policy
+        return tf.cast(image, tf.float16), tf.one_hot(label, self.config.NUM_CLASSES)
+
+    def write_tfrecord(self, paths: List[str], labels: List[int], tfrecord_path: Path) -> Path:
+        """Serialize face-cropped uint8 images to a TFRecord split cache.
+
+        Decode and the face-detection crop happen once here; subsequent
+        epochs stream fixed-shape raw tensors straight off disk instead of
+        re-decoding and re-detecting every image.
+        """
+        with tf.io.TFRecordWriter(str(tfrecord_path)) as writer:
+            for path, label in zip(paths, labels):
+                buffer = np.frombuffer(Path(path).read_bytes(), dtype=np.uint8)
+                image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+                if image is None:
+                    print(f"Warning: skipping unreadable image: {path}")
+                    continue
+                face_img = self._crop_largest_face(image)
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'image/encoded': tf.train.Feature(
+                        bytes_list=tf.train.BytesList(value=[face_img.tobytes()])
+                    ),
+                    'label': tf.train.Feature(
+                        int64_list=tf.train.Int64List(value=[label])
+                    ),
+                }))
+                writer.write(example.SerializeToString())
+        return tfrecord_path
+
+    def _make_dataset_from_tfrecord(self, tfrecord_path: Path, num_examples: int,
+                                    is_training: bool) -> tf.data.Dataset:
+        """Stream a cached TFRecord split through augmentation and batching."""
+        height, width = self.config.IMG_HEIGHT, self.config.IMG_WIDTH
+        feature_spec = {
+            'image/encoded': tf.io.FixedLenFeature([], tf.string),
+            'label': tf.io.FixedLenFeature([], tf.int64),
+        }
+
+        def parse_example(serialized):
+            parsed = tf.io.parse_single_example(serialized, feature_spec)
+            image = tf.io.decode_raw(parsed['image/encoded'], tf.uint8)
+            image = tf.reshape(image, (height, width, 3))
+            image = tf.cast(image, tf.float32) / 255.0
+            label = tf.cast(parsed['label'], tf.int32)
+            return self._finalize_example(image, label, is_training)
+
+        dataset = tf.data.TFRecordDataset(
+            str(tfrecord_path), num_parallel_reads=tf.data.AUTOTUNE
+        )
+        if is_training:
+            dataset = dataset.shuffle(buffer_size=num_examples)
+        dataset = dataset.map(parse_example, num_parallel_calls=tf.data.AUTOTUNE)
+        if not is_training:
+            # Validation replays every epoch and the test split is
+            # iterated twice (evaluate, then detailed predictions), so
+            # keep the parsed tensors resident: every pass after the
+            # first skips the TFRecord read and per-example parse
+            dataset = dataset.cache()
+        dataset = dataset.batch(self.config.BATCH_SIZE)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def _cached_dataset(self, split_name: str, paths: List[str], labels: List[int],
+                        is_training: bool) -> tf.data.Dataset:
+        """Build a split dataset backed by a content-keyed TFRecord cache.
+
+        The cache file name carries a digest of the sorted path list and
+        each file's mtime, so adding, removing, or replacing images (or a
+        reshuffled train/val split) invalidates the cache instead of
+        silently replaying stale records.
+        """
+        cache_dir = Path("tfrecord_cache")
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha1()
+        for path in sorted(paths):
+            digest.update(path.encode())
+            digest.update(str(os.path.getmtime(path)).encode())
+        tfrecord_path = cache_dir / f"{split_name}-{digest.hexdigest()[:12]}.tfrecord"
+
+        if not tfrecord_path.exists():
+            print(f"Caching {split_name} split to {tfrecord_path}...")
+            # Drop superseded caches for this split before writing the new one
+            for stale in cache_dir.glob(f"{split_name}-*.tfrecord"):
+                stale.unlink()
+            self.write_tfrecord(paths, labels, tfrecord_path)
+        return self._make_dataset_from_tfrecord(tfrecord_path, len(paths), is_training)
+
     def create_data_generators(self) -> Tuple[tf.data.Dataset, tf.data.Dataset, tf.data.Dataset]:
-        """Create training, validation, and test data generators with enhanced preprocessing."""
-        
-        # Load training data
-        train_images, train_labels, _ = self.load_dataset(
-            Path("C:/Users/xxshi/Desktop/face bs/backend/FaceShapeDS/training_set"),
-            use_augmentation=True
+        """Create streaming training, validation, and test datasets.
+
+        Only paths are collected up front; decode and augmentation happen
+        per batch inside the tf.data pipeline, so training starts without
+        materializing the whole dataset in RAM first.
+        """
+        train_paths, train_labels = self.list_image_paths(
+            Path("C:/Users/xxshi/Desktop/face bs/backend/FaceShapeDS/training_set")
         )
-        
+
         # Split training data into train and validation
         X_train, X_val, y_train, y_val = train_test_split(
-            train_images, train_labels,
+            train_paths, train_labels,
             test_size=self.config.VALIDATION_SPLIT,
             stratify=train_labels,
             random_state=42
         )
-        
-        # Load test data
-        test_images, test_labels, _ = self.load_dataset(
-            Path("C:/Users/xxshi/Desktop/face bs/backend/FaceShapeDS/testing_set"),
-            use_augmentation=False
+
+        test_paths, test_labels = self.list_image_paths(
+            Path("C:/Users/xxshi/Desktop/face bs/backend/FaceShapeDS/testing_set")
         )
-        
-        # Convert labels to categorical
-        y_train_cat = to_categorical(y_train, num_classes=self.config.NUM_CLASSES)
-        y_val_cat = to_categorical(y_val, num_classes=self.config.NUM_CLASSES)
-        y_test_cat = to_categorical(test_labels, num_classes=self.config.NUM_CLASSES)
-        
-        # Create TensorFlow datasets with enhanced preprocessing
-        train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train_cat))
-        train_dataset = train_dataset.shuffle(buffer_size=len(X_train))
-        train_dataset = train_dataset.batch(self.config.BATCH_SIZE)
-        train_dataset = train_dataset.prefetch(tf.data.AUTOTUNE)
-        
-        val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val_cat))
-        val_dataset = val_dataset.batch(self.config.BATCH_SIZE)
-        val_dataset = val_dataset.prefetch(tf.data.AUTOTUNE)
-        
-        test_dataset = tf.data.Dataset.from_tensor_slices((test_images, y_test_cat))
-        test_dataset = test_dataset.batch(self.config.BATCH_SIZE)
-        test_dataset = test_dataset.prefetch(tf.data.AUTOTUNE)
-        
+
+        train_dataset = self._cached_dataset("train", X_train, y_train, is_training=True)
+        val_dataset = self._cached_dataset("val", X_val, y_val, is_training=False)
+        test_dataset = self._cached_dataset("test", test_paths, test_labels, is_training=False)
+
         print(f"Training samples: {len(X_train)}")
         print(f"Validation samples: {len(X_val)}")
-        print(f"Test samples: {len(test_images)}")
-        
+        print(f"Test samples: {len(test_paths)}")
+
         return train_dataset, val_dataset, test_dataset
@@ -2,20 +2,28 @@
 CNN model for face shape classification using transfer learning.
 """
 
+import os
+
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import Model, load_model
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, BatchNormalization
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, LayerNormalization
 from tensorflow.keras.applications import EfficientNetB0, ResNet50, MobileNetV2
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 from tensorflow.keras.metrics import Precision, Recall
 from pathlib import Path
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, List, Optional
 import joblib
 
 from .model_config import ModelConfig
-from .data_loader import FaceShapeDataLoader
+from .data_loader import FaceShapeDataLoader, IMAGENET_MEAN, IMAGENET_STD
+
+# Let cuDNN benchmark conv algorithms, and run FP32 matmuls through TF32
+# Tensor Cores on Ampere+ GPUs; both are accuracy-neutral speedups
+os.environ.setdefault('TF_CUDNN_USE_AUTOTUNE', '1')
+if ModelConfig.ENABLE_TF32:
+    tf.config.experimental.enable_tensor_float_32_execution(True)
 
 class FaceShapeCNN:
     """CNN model for face shape classification."""
@@ -23,15 +31,29 @@ class FaceShapeCNN:
     def __init__(self, config: ModelConfig = None):
         self.config = config or ModelConfig()
         self.model = None
+        self.base_model = None
         self.history = None
+        self._infer_fn = None
         self.data_loader = FaceShapeDataLoader(self.config)
+        # Class names as an object ndarray in index order: numpy argmax
+        # indices select at C level without a Python dict hash per lookup
+        self._class_name_arr = np.array(
+            [self.data_loader.idx_to_class[i] for i in range(self.config.NUM_CLASSES)],
+            dtype=object
+        )
+        self._class_names_ordered = self._class_name_arr.tolist()
         
         # Ensure model directory exists
         self.config.create_directories()
     
     def build_model(self) -> Model:
         """Build the CNN model with transfer learning."""
-        
+
+        # Mixed precision: half-width activations and Tensor Core matmuls
+        # for the backbone, with the head kept FP32 for stable softmax
+        if self.config.MIXED_PRECISION:
+            tf.keras.mixed_precision.set_global_policy(self.config.MIXED_PRECISION)
+
         # Choose base model
         if self.config.BASE_MODEL == 'EfficientNetB0':
             base_model = EfficientNetB0(
@@ -57,36 +79,104 @@ class FaceShapeCNN:
         # Freeze base model layers if specified
         if self.config.FREEZE_BASE_LAYERS:
             base_model.trainable = False
-        
-        # Add custom classification head
-        x = base_model.output
+
+        # Augmentation lives in the model as preprocessing layers: it runs
+        # on the GPU fused with the forward pass and is automatically
+        # disabled at inference, so the input pipeline only decodes/normalizes
+        aug_layers = [
+            tf.keras.layers.RandomRotation(self.config.ROTATION_RANGE / 360),
+            tf.keras.layers.RandomTranslation(
+                self.config.HEIGHT_SHIFT_RANGE, self.config.WIDTH_SHIFT_RANGE
+            ),
+            tf.keras.layers.RandomZoom(self.config.ZOOM_RANGE),
+            # Factors are the max deviation from 1.0 in the configured
+            # multiplicative ranges. RandomContrast scales around the mean,
+            # so its factor is range-independent; RandomBrightness adds an
+            # absolute delta and must be told inputs are [0, 1] pixels
+            # (its default value_range is (0, 255))
+            tf.keras.layers.RandomContrast(
+                max(1 - self.config.CONTRAST_RANGE[0], self.config.CONTRAST_RANGE[1] - 1)
+            ),
+            tf.keras.layers.RandomBrightness(
+                max(1 - self.config.BRIGHTNESS_RANGE[0], self.config.BRIGHTNESS_RANGE[1] - 1),
+                value_range=(0.0, 1.0)
+            ),
+        ]
+        if self.config.HORIZONTAL_FLIP:
+            aug_layers.insert(0, tf.keras.layers.RandomFlip('horizontal'))
+        augmentation = tf.keras.Sequential(aug_layers, name='augmentation')
+
+        # The pipeline hands the model raw [0, 1] pixels; standardize here,
+        # after augmentation, so brightness/contrast jitter operates on real
+        # pixel values instead of already-standardized ones
+        normalization = tf.keras.layers.Normalization(
+            axis=-1,
+            mean=IMAGENET_MEAN.numpy(),
+            variance=np.square(IMAGENET_STD.numpy()),
+            name='imagenet_norm'
+        )
+
+        inputs = tf.keras.Input(
+            shape=(self.config.IMG_HEIGHT, self.config.IMG_WIDTH, self.config.IMG_CHANNELS)
+        )
+        x = augmentation(inputs)
+        x = normalization(x)
+        x = base_model(x)
+
+        # Add custom classification head. LayerNormalization instead of
+        # BatchNormalization here: batch-independent (BN running stats are
+        # noisy at batch size 16) and a single fused kernel per step
         x = GlobalAveragePooling2D()(x)
-        x = BatchNormalization()(x)
+        x = LayerNormalization()(x)
         x = Dense(512, activation='relu')(x)
         x = Dropout(self.config.DROPOUT_RATE)(x)
         x = Dense(256, activation='relu')(x)
         x = Dropout(self.config.DROPOUT_RATE)(x)
-        predictions = Dense(self.config.NUM_CLASSES, activation='softmax', name='predictions')(x)
-        
+        predictions = Dense(
+            self.config.NUM_CLASSES, activation='softmax', name='predictions',
+            dtype='float32'  # keep softmax/cross-entropy in FP32 under mixed precision
+        )(x)
+
         # Create the model
-        model = Model(inputs=base_model.input, outputs=predictions)
-        
-        # Compile the model
-        model.compile(
-            optimizer=Adam(learning_rate=self.config.LEARNING_RATE),
-            loss='categorical_crossentropy',
-            metrics=['accuracy', Precision(name='precision'), Recall(name='recall')]
-        )
-        
+        model = Model(inputs=inputs, outputs=predictions)
+
         self.model = model
+        self.base_model = base_model
+        self._infer_fn = None
+        self._compile_model(self.config.LEARNING_RATE)
         return model
+
+    def _compile_model(self, learning_rate: float):
+        """Compile the model; FP16 gradients need loss scaling to avoid underflow."""
+        # AdamW (TF >= 2.11) takes the XLA-fused update path, which matters
+        # at BATCH_SIZE=16 where per-step optimizer overhead is non-trivial;
+        # EMA weights in the final checkpoint come free with it
+        optimizer = tf.keras.optimizers.AdamW(
+            learning_rate=learning_rate,
+            weight_decay=1e-4,
+            jit_compile=self.config.JIT_COMPILE,
+            use_ema=True
+        )
+        if self.config.MIXED_PRECISION == 'mixed_float16':
+            optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+        self.model.compile(
+            optimizer=optimizer,
+            loss='categorical_crossentropy',
+            metrics=['accuracy', Precision(name='precision'), Recall(name='recall')],
+            jit_compile=self.config.JIT_COMPILE
+        )
     
     def train(self, train_dataset, val_dataset) -> Dict[str, Any]:
         """Train the model."""
         
         if self.model is None:
             self.build_model()
-        
+
+        # Overlap CPU input preparation with GPU compute even if the caller
+        # hands us a plain dataset; prefetch is a no-op when already applied
+        train_dataset = train_dataset.prefetch(tf.data.AUTOTUNE)
+        val_dataset = val_dataset.prefetch(tf.data.AUTOTUNE)
+
         # Define callbacks
         callbacks = [
             EarlyStopping(
@@ -113,17 +203,43 @@ class FaceShapeCNN:
         print(f"Starting training for {self.config.EPOCHS} epochs...")
         print(f"Model architecture: {self.config.BASE_MODEL}")
         print(f"Target accuracy: {self.config.TARGET_ACCURACY}")
-        
-        # Train the model
-        self.history = self.model.fit(
-            train_dataset,
-            epochs=self.config.EPOCHS,
-            validation_data=val_dataset,
-            callbacks=callbacks,
-            verbose=1
-        )
-        
-        return self.history.history
+
+        combined_history: Dict[str, Any] = {}
+
+        def run_fit(epochs: int, initial_epoch: int):
+            history = self.model.fit(
+                train_dataset,
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                validation_data=val_dataset,
+                callbacks=callbacks,
+                verbose=1
+            )
+            for key, values in history.history.items():
+                combined_history.setdefault(key, []).extend(values)
+            return history
+
+        # Phase 1: train only the head on a frozen backbone — no backbone
+        # gradients, so each warmup step is a fraction of the full cost
+        warmup = min(self.config.WARMUP_EPOCHS, self.config.EPOCHS)
+        if warmup > 0 and self.base_model is not None:
+            print(f"Phase 1: head-only training for {warmup} epochs...")
+            self.base_model.trainable = False
+            self._compile_model(self.config.LEARNING_RATE)
+            run_fit(epochs=warmup, initial_epoch=0)
+
+            # Phase 2: unfreeze only the top blocks and fine-tune at 10x
+            # lower LR; earlier feature-extractor layers stay frozen
+            print(f"Phase 2: fine-tuning top {self.config.UNFREEZE_TOP_K} layers...")
+            self.base_model.trainable = True
+            for layer in self.base_model.layers[:-self.config.UNFREEZE_TOP_K]:
+                layer.trainable = False
+            self._compile_model(self.config.LEARNING_RATE / 10)
+
+        if self.config.EPOCHS > warmup or not combined_history:
+            self.history = run_fit(epochs=self.config.EPOCHS, initial_epoch=warmup)
+
+        return combined_history
     
     def evaluate(self, test_dataset) -> Dict[str, float]:
         """Evaluate the model on test data."""
@@ -132,16 +248,10 @@ class FaceShapeCNN:
         
         print("Evaluating model on test data...")
         results = self.model.evaluate(test_dataset, verbose=1)
-        
-        # Create results dictionary
-        metrics = {}
-        for i, metric_name in enumerate(self.model.metrics_names):
-            metrics[metric_name] = results[i]
-        
-        print(f"Test Results:")
-        for metric, value in metrics.items():
-            print(f"  {metric}: {value:.4f}")
-        
+
+        metrics = dict(zip(self.model.metrics_names, results))
+        print('Test Results: ' + ', '.join(f'{k}={v:.4f}' for k, v in metrics.items()))
+
         return metrics
     
     def predict(self, image_path: str) -> Tuple[str, float, Dict[str, float]]:
@@ -158,17 +268,177 @@ class FaceShapeCNN:
         
         # Get predicted class
         predicted_idx = np.argmax(predicted_probs)
-        predicted_class = self.data_loader.idx_to_class[predicted_idx]
-        confidence = float(predicted_probs[predicted_idx])
-        
-        # Create probability dictionary
-        class_probabilities = {}
-        for idx, prob in enumerate(predicted_probs):
-            class_name = self.data_loader.idx_to_class[idx]
-            class_probabilities[class_name] = float(prob)
-        
-        return predicted_class, confidence, class_probabilities
-    
+        predicted_class = self._class_name_arr[predicted_idx]
+
+        # One bulk tolist() unboxes every numpy scalar at once instead of
+        # a float() call per class
+        probs_list = predicted_probs.tolist()
+        class_probabilities = dict(zip(self._class_names_ordered, probs_list))
+
+        return predicted_class, probs_list[predicted_idx], class_probabilities
+
+    def precompute_features(self, dataset, cache_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Run the frozen backbone once and return pooled features with labels.
+
+        With a frozen backbone the features are identical every epoch, so
+        head-only training can consume cached [N, 1280] tensors instead of
+        re-running the feature extractor per step. Pass cache_path to
+        persist them as an .npz between runs.
+        """
+        if cache_path is not None and Path(cache_path).exists():
+            cached = np.load(cache_path)
+            return cached['features'], cached['labels']
+
+        if self.model is None:
+            self.build_model()
+
+        if self.base_model is not None:
+            # Route through the model's own normalization layer so cached
+            # features see the same standardized pixels fit() does;
+            # augmentation is deliberately skipped to keep features stable
+            extractor_inputs = tf.keras.Input(shape=(
+                self.config.IMG_HEIGHT, self.config.IMG_WIDTH, self.config.IMG_CHANNELS
+            ))
+            normalized = self.model.get_layer('imagenet_norm')(extractor_inputs)
+            feature_extractor = Model(
+                extractor_inputs,
+                GlobalAveragePooling2D()(self.base_model(normalized))
+            )
+        else:
+            # Loaded models don't carry the base_model handle; recover the
+            # pooled features from the loaded graph's own pooling layer
+            pooling_layers = [
+                layer for layer in self.model.layers
+                if isinstance(layer, GlobalAveragePooling2D)
+            ]
+            if not pooling_layers:
+                raise ValueError(
+                    "Cannot build a feature extractor: the loaded model has "
+                    "no GlobalAveragePooling2D layer and base_model is unset"
+                )
+            feature_extractor = Model(self.model.input, pooling_layers[0].output)
+
+        # Single pass over the dataset: each batch yields its features and
+        # labels together, so a shuffled (or reshuffling) split cannot
+        # misalign the pairs the way separate predict/label passes would
+        feature_batches = []
+        label_batches = []
+        for x, y in dataset:
+            feature_batches.append(feature_extractor.predict_on_batch(x))
+            label_batches.append(np.argmax(y.numpy(), axis=1))
+        features = np.concatenate(feature_batches)
+        labels = np.concatenate(label_batches)
+
+        if cache_path is not None:
+            np.savez(cache_path, features=features, labels=labels)
+        return features, labels
+
+    def train_head_on_features(self, features: np.ndarray, labels: np.ndarray,
+                               val_features: Optional[np.ndarray] = None,
+                               val_labels: Optional[np.ndarray] = None,
+                               epochs: Optional[int] = None) -> Dict[str, Any]:
+        """Train only the classification head on precomputed backbone features.
+
+        Each epoch touches just the small MLP head, so hundreds of epochs
+        cost less than one pass through the full network.
+        """
+        head = tf.keras.Sequential([
+            tf.keras.Input(shape=(features.shape[1],)),
+            LayerNormalization(),
+            Dense(512, activation='relu'),
+            Dropout(self.config.DROPOUT_RATE),
+            Dense(256, activation='relu'),
+            Dropout(self.config.DROPOUT_RATE),
+            Dense(self.config.NUM_CLASSES, activation='softmax', dtype='float32'),
+        ], name='feature_head')
+        head.compile(
+            optimizer=Adam(learning_rate=self.config.LEARNING_RATE),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+        train_ds = tf.data.Dataset.from_tensor_slices((features, labels)) \
+            .shuffle(len(labels)) \
+            .batch(self.config.BATCH_SIZE) \
+            .prefetch(tf.data.AUTOTUNE)
+        val_ds = None
+        if val_features is not None:
+            val_ds = tf.data.Dataset.from_tensor_slices((val_features, val_labels)) \
+                .batch(self.config.BATCH_SIZE) \
+                .prefetch(tf.data.AUTOTUNE)
+
+        history = head.fit(
+            train_ds,
+            epochs=epochs or self.config.EPOCHS,
+            validation_data=val_ds,
+            verbose=1
+        )
+        return history.history
+
+    def _get_inference_fn(self):
+        """Return a compiled inference function traced once per model.
+
+        The fixed input signature (batch dim left as None) means variable
+        batch sizes reuse the same trace instead of triggering a retrace,
+        and the direct model call skips predict()'s callback machinery.
+        """
+        if self._infer_fn is None:
+            self._infer_fn = tf.function(
+                lambda batch: self.model(batch, training=False),
+                input_signature=[tf.TensorSpec(
+                    [None, self.config.IMG_HEIGHT, self.config.IMG_WIDTH,
+                     self.config.IMG_CHANNELS],
+                    tf.float32
+                )],
+                jit_compile=self.config.JIT_COMPILE
+            )
+        return self._infer_fn
+
+    def predict_batch(self, image_paths: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """Predict face shapes for a batch of images with one model call."""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+
+        # Preprocess into a single [N, H, W, 3] tensor and dispatch once
+        batch = np.stack([
+            self.data_loader.load_image(path, is_training=False)
+            for path in image_paths
+        ]).astype(np.float32)
+        predictions = self._get_inference_fn()(batch).numpy()
+
+        predicted_idxs = np.argmax(predictions, axis=1)
+        results = []
+        predicted_names = self._class_name_arr[predicted_idxs]
+        for probs_list, predicted_idx, predicted_class in zip(
+            predictions.tolist(), predicted_idxs, predicted_names
+        ):
+            class_probabilities = dict(zip(self._class_names_ordered, probs_list))
+            results.append((
+                predicted_class,
+                probs_list[predicted_idx],
+                class_probabilities
+            ))
+        return results
+
+    def predict_topk(self, image_array: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k fast path for serving: indices and confidences only.
+
+        Takes an already-preprocessed [N, H, W, 3] batch and skips the
+        per-class probability dicts entirely — callers that just need the
+        argmax avoid the allocation churn of predict()'s richer return.
+        Class names for the indices live in self._class_name_arr.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+
+        probs = self._get_inference_fn()(
+            np.asarray(image_array, dtype=np.float32)
+        ).numpy()
+        # argpartition is O(C) vs full-sort O(C log C); top-k comes back
+        # unsorted, which is fine for the k=1 serving case
+        idx = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+        return idx, np.take_along_axis(probs, idx, axis=1)
+
     def save_model(self, filepath: Optional[str] = None):
         """Save the trained model."""
         if self.model is None:
@@ -180,15 +450,21 @@ class FaceShapeCNN:
         self.model.save(filepath)
         print(f"Model saved to: {filepath}")
     
-    def load_model(self, filepath: Optional[str] = None):
-        """Load a trained model."""
+    def load_model(self, filepath: Optional[str] = None, compile: bool = False):
+        """Load a trained model.
+
+        Loads uncompiled by default, which skips optimizer reconstruction;
+        pass compile=True when resuming training or calling evaluate().
+        """
         if filepath is None:
             filepath = str(self.config.get_model_path())
-        
+
         if not Path(filepath).exists():
             raise FileNotFoundError(f"Model file not found: {filepath}")
-        
-        self.model = load_model(filepath)
+
+        self.model = load_model(filepath, compile=compile)
+        self.base_model = None
+        self._infer_fn = None
         print(f"Model loaded from: {filepath}")
 
 def load_trained_model(model_path: Optional[str] = None) -> FaceShapeCNN:
@@ -4,10 +4,13 @@ Training script for the face shape CNN model.
 
 import os
 import sys
+import threading
 import time
 import json
 from pathlib import Path
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')  # headless backend, skips GUI toolkit init
+from matplotlib.figure import Figure
 import seaborn as sns
 from sklearn.metrics import classification_report, confusion_matrix
 import numpy as np
@@ -20,8 +23,13 @@ from ml_models.data_loader import FaceShapeDataLoader
 from ml_models.model_config import ModelConfig
 
 def plot_training_history(history, save_path: str):
-    """Plot and save training history."""
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    """Plot and save training history.
+
+    Uses the object-oriented Figure API rather than pyplot global state so
+    it is safe to run on a background thread alongside other plotting.
+    """
+    fig = Figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2)
     
     # Accuracy
     axes[0, 0].plot(history['accuracy'], label='Training Accuracy')
@@ -61,9 +69,8 @@ def plot_training_history(history, save_path: str):
         axes[1, 1].legend()
         axes[1, 1].grid(True)
     
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=120, bbox_inches='tight')
     print(f"Training history plot saved to: {save_path}")
 
 def evaluate_model_detailed(model: FaceShapeCNN, test_dataset, config: ModelConfig):
@@ -75,14 +82,10 @@ def evaluate_model_detailed(model: FaceShapeCNN, test_dataset, config: ModelConf
     # Basic evaluation
     test_metrics = model.evaluate(test_dataset)
     
-    # Get predictions for confusion matrix
-    y_true = []
-    y_pred = []
-    
-    for batch_x, batch_y in test_dataset:
-        predictions = model.model.predict(batch_x, verbose=0)
-        y_true.extend(np.argmax(batch_y.numpy(), axis=1))
-        y_pred.extend(np.argmax(predictions, axis=1))
+    # Get predictions for the confusion matrix in one streamed predict call
+    # instead of re-entering TF once per batch from Python
+    y_pred = np.argmax(model.model.predict(test_dataset, verbose=0), axis=1)
+    y_true = np.concatenate([np.argmax(y.numpy(), axis=1) for _, y in test_dataset])
     
     # Classification report
     print("\nClassification Report:")
@@ -96,34 +99,40 @@ def evaluate_model_detailed(model: FaceShapeCNN, test_dataset, config: ModelConf
     
     # Confusion matrix
     cm = confusion_matrix(y_true, y_pred)
-    
-    # Plot confusion matrix
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(
-        cm, 
-        annot=True, 
-        fmt='d', 
-        cmap='Blues',
-        xticklabels=config.CLASS_NAMES,
-        yticklabels=config.CLASS_NAMES
-    )
-    plt.title('Confusion Matrix')
-    plt.xlabel('Predicted')
-    plt.ylabel('Actual')
-    
-    cm_path = config.MODEL_DIR / "confusion_matrix.png"
-    plt.savefig(cm_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"Confusion matrix saved to: {cm_path}")
-    
+
+    # Render the heatmap on a background thread; figure rendering isn't
+    # on the training critical path and dpi-heavy savefig is slow
+    def save_confusion_matrix():
+        fig = Figure(figsize=(10, 8))
+        ax = fig.subplots()
+        sns.heatmap(
+            cm,
+            annot=True,
+            fmt='d',
+            cmap='Blues',
+            xticklabels=config.CLASS_NAMES,
+            yticklabels=config.CLASS_NAMES,
+            ax=ax
+        )
+        ax.set_title('Confusion Matrix')
+        ax.set_xlabel('Predicted')
+        ax.set_ylabel('Actual')
+
+        cm_path = config.MODEL_DIR / "confusion_matrix.png"
+        fig.savefig(cm_path, dpi=120, bbox_inches='tight')
+        print(f"Confusion matrix saved to: {cm_path}")
+
+    cm_thread = threading.Thread(target=save_confusion_matrix)
+    cm_thread.start()
+
     # Calculate per-class accuracy
     per_class_accuracy = cm.diagonal() / cm.sum(axis=1)
     print("\nPer-class Accuracy:")
     print("-" * 20)
     for i, class_name in enumerate(config.CLASS_NAMES):
         print(f"{class_name}: {per_class_accuracy[i]:.4f}")
-    
-    return test_metrics, report, cm
+
+    return test_metrics, report, cm, cm_thread
 
 def main():
     """Main training function."""
@@ -174,12 +183,15 @@ def main():
     training_time = time.time() - start_time
     print(f"\nTraining completed in {training_time:.2f} seconds ({training_time/60:.2f} minutes)")
     
-    # Save training history plot
+    # Save training history plot in the background while evaluation runs
     history_plot_path = config.MODEL_DIR / "training_history.png"
-    plot_training_history(history, str(history_plot_path))
-    
+    history_plot_thread = threading.Thread(
+        target=plot_training_history, args=(history, str(history_plot_path))
+    )
+    history_plot_thread.start()
+
     # Detailed evaluation
-    test_metrics, report, cm = evaluate_model_detailed(model, test_dataset, config)
+    test_metrics, report, cm, cm_thread = evaluate_model_detailed(model, test_dataset, config)
     
     # Save evaluation results
     results = {
@@ -210,7 +222,11 @@ def main():
     else:
         print(f"\n⚠️  Target accuracy not reached. Final test accuracy: {final_accuracy:.4f}")
         print(f"Target was: {config.TARGET_ACCURACY:.4f}")
-    
+
+    # Make sure background plot writers finished before exiting
+    history_plot_thread.join()
+    cm_thread.join()
+
     print("\nTraining complete!")
 
 if __name__ == "__main__":
@@ -7,10 +7,19 @@ to determine which performs better for our facial analysis task.
 import os
 import sys
 import base64
+import concurrent.futures
+import io
 import time
 import json
 from pathlib import Path
 import requests
+from PIL import Image
+
+# Shared session with keep-alive: concurrent calls each get a pooled
+# connection and repeat calls skip the TCP+TLS handshake
+_SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+_SESSION.mount("https://", _adapter)
 
 # Set your API key here (or use environment variable)
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "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")
@@ -29,9 +38,17 @@ Line 1: Face shape
 Line 2: Color season"""
 
 def encode_image(image_path):
-    """Encode an image to base64."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    """Downscale and base64-encode an image for the API.
+
+    The models don't need original resolution; capping at 768px and
+    re-encoding as JPEG cuts the request payload 5-20x versus sending
+    the raw file bytes.
+    """
+    img = Image.open(image_path).convert('RGB')
+    img.thumbnail((768, 768))
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=85)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
 
 def test_model(model_id, image_path, prompt):
     """Test a specific model with the given image and prompt."""
@@ -67,7 +84,7 @@ def test_model(model_id, image_path, prompt):
     
     start_time = time.time()
     try:
-        response = requests.post(
+        response = _SESSION.post(
             "https://api.openrouter.ai/api/v1/chat/completions",
             headers=headers,
             json=payload,
@@ -125,22 +142,22 @@ def main():
         "qwen/qwen2.5-vl-3b-instruct:free"
     ]
     
-    results = {}
-    
-    # Test each model
+    # The endpoints are independent, so run both requests concurrently;
+    # wall time is max(latencies) instead of their sum plus sleeps
+    print(f"\nTesting models: {', '.join(models)}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(models)) as executor:
+        results = dict(zip(models, executor.map(
+            lambda m: test_model(m, image_path, PROMPT_TEXT), models
+        )))
+
     for model in models:
-        print(f"\nTesting model: {model}")
-        result = test_model(model, image_path, PROMPT_TEXT)
-        results[model] = result
-        
+        result = results[model]
+        print(f"\nModel: {model}")
         print(f"Response time: {result['duration']:.2f} seconds")
         if "error" in result:
             print(f"Error: {result['error']}")
         else:
             print(f"Response:\n{result['response_text']}")
-        
-        # Wait a bit between API calls
-        time.sleep(2)
     
     # Compare and recommend
     recommend_model = None
@@ -11,14 +11,21 @@ from tensorflow.keras.applications import EfficientNetB0
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.utils import to_categorical
+from tensorflow.keras import mixed_precision
 from sklearn.model_selection import train_test_split
-import cv2
-from PIL import Image, ImageFile
 import random
 
-# Allow loading of truncated images
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+# FP16 compute on Tensor Cores with FP32 master weights; ~1.5-2x faster
+# conv forward+backward and half the activation memory
+mixed_precision.set_global_policy('mixed_float16')
+
+# TF32 on Ampere+: FP32-range Tensor Core matmul/conv for any ops the
+# FP16 policy leaves in float32 (on by default, explicit for clarity)
+tf.config.experimental.enable_tensor_float_32_execution(True)
+
+# Allocate GPU memory incrementally instead of reserving it all at startup
+for _gpu in tf.config.list_physical_devices('GPU'):
+    tf.config.experimental.set_memory_growth(_gpu, True)
 
 print("Starting robust face shape training...")
 print("TensorFlow version:", tf.__version__)
@@ -35,116 +42,164 @@ DATASET_ROOT = Path("FaceShapeDS")
 TRAIN_DIR = DATASET_ROOT / "training_set"
 TEST_DIR = DATASET_ROOT / "testing_set"
 
+# Persist decoded/resized tensors to disk between runs; set USE_CACHE=0
+# to bust the cache after changing decode or resize parameters
+USE_CACHE = os.environ.get("USE_CACHE", "1") == "1"
+CACHE_DIR = Path(".tfdata_cache")
+
 class_names = ['Heart', 'Oblong', 'Oval', 'Round', 'Square']
 class_to_idx = {name: idx for idx, name in enumerate(class_names)}
 
-def load_and_preprocess_image(image_path, target_size=(224, 224)):
-    """Load and preprocess a single image with error handling."""
-    try:
-        # Try multiple loading methods
-        img = None
-        
-        # Method 1: OpenCV
-        try:
-            img = cv2.imread(str(image_path))
-            if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                img = cv2.resize(img, target_size)
-        except:
-            pass
-        
-        # Method 2: PIL if OpenCV failed
-        if img is None:
-            try:
-                with Image.open(image_path) as pil_img:
-                    pil_img = pil_img.convert('RGB')
-                    pil_img = pil_img.resize(target_size)
-                    img = np.array(pil_img)
-            except:
-                pass
-        
-        if img is None:
-            return None
-            
-        # Normalize
-        img = img.astype(np.float32) / 255.0
-        return img
-        
-    except Exception as e:
-        print(f"Failed to load {image_path}: {e}")
-        return None
-
-def load_dataset(data_dir, max_images_per_class=None):
-    """Load dataset with robust error handling."""
-    print(f"Loading dataset from: {data_dir}")
-    
-    images = []
+def list_dataset_files(data_dir, max_images_per_class=None):
+    """Collect image paths and labels without decoding anything."""
+    print(f"Listing dataset from: {data_dir}")
+
+    paths = []
     labels = []
-    loaded_counts = {class_name: 0 for class_name in class_names}
-    
+
     for class_name in class_names:
         class_dir = data_dir / class_name
         if not class_dir.exists():
             print(f"Warning: Class directory not found: {class_dir}")
             continue
-        
+
         class_idx = class_to_idx[class_name]
-        
-        # Get all image files
-        image_files = (list(class_dir.glob("*.jpg")) + 
-                      list(class_dir.glob("*.jpeg")) + 
-                      list(class_dir.glob("*.png")))
-        
+
+        # Single scandir pass instead of one glob walk per extension
+        image_files = [
+            Path(entry.path) for entry in os.scandir(class_dir)
+            if entry.is_file()
+            and entry.name.rsplit('.', 1)[-1].lower() in ('jpg', 'jpeg', 'png')
+        ]
+
         if max_images_per_class:
             image_files = image_files[:max_images_per_class]
-        
-        print(f"  Loading {class_name}: {len(image_files)} files")
-        
-        for img_path in image_files:
-            img = load_and_preprocess_image(img_path)
-            if img is not None:
-                images.append(img)
-                labels.append(class_idx)
-                loaded_counts[class_name] += 1
-            else:
-                print(f"    Skipped: {img_path.name}")
-    
-    print("Successfully loaded images:")
-    for class_name, count in loaded_counts.items():
-        print(f"  {class_name}: {count}")
-    
-    return np.array(images), np.array(labels)
 
-def create_model():
-    """Create the CNN model."""
-    print("Building model...")
-    
-    # Create base model
+        print(f"  {class_name}: {len(image_files)} files")
+        paths.extend(str(p) for p in image_files)
+        labels.extend([class_idx] * len(image_files))
+
+    return paths, labels
+
+def make_dataset(paths, labels, shuffle=False, cache_name=None):
+    """Build a tf.data pipeline that decodes in parallel and skips bad files.
+
+    Decode/resize overlaps with GPU compute instead of blocking training on
+    a serial CPU loop, and nothing bigger than a batch is ever resident in
+    host memory. Corrupted images raise inside the graph and are dropped by
+    ignore_errors, replacing the old try-every-loader fallbacks.
+    """
+    def decode_fn(path, label):
+        raw = tf.io.read_file(path)
+        # JPEGs get the fast integer DCT and truncated-file recovery
+        # (subsuming the old PIL LOAD_TRUNCATED_IMAGES fallback); PNGs
+        # take the generic decoder
+        img = tf.cond(
+            tf.strings.regex_full_match(tf.strings.lower(path), r".*\.jpe?g"),
+            lambda: tf.io.decode_jpeg(
+                raw, channels=3, dct_method='INTEGER_FAST',
+                try_recover_truncated=True, acceptable_fraction=0.5
+            ),
+            lambda: tf.io.decode_image(raw, channels=3, expand_animations=False)
+        )
+        img.set_shape([None, None, 3])
+        img = tf.image.resize(img, (IMG_SIZE, IMG_SIZE), method='bilinear')
+        # Stay uint8 through cache and host->device transfer (4x fewer
+        # bytes); the model's Rescaling layer divides by 255 on the GPU
+        img = tf.cast(img, tf.uint8)
+        # Integer labels + sparse loss skip the (N, 5) one-hot allocation
+        return img, label
+
+    ds = tf.data.Dataset.from_tensor_slices(
+        (tf.constant(paths), tf.constant(labels, dtype=tf.int32))
+    )
+    ds = ds.map(decode_fn, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.apply(tf.data.experimental.ignore_errors())
+    if USE_CACHE and cache_name:
+        # First run writes decoded tensors to disk; later runs (not just
+        # later epochs) replay them without touching the JPEGs
+        ds = ds.snapshot(path=str(CACHE_DIR / cache_name), compression='AUTO')
+    else:
+        ds = ds.cache()  # decoded 224x224 tensors fit in RAM for epoch 2+
+    if shuffle:
+        ds = ds.shuffle(buffer_size=len(paths))
+    ds = ds.batch(BATCH_SIZE)
+    # Host-side prefetch only: callers still map() and take() from this
+    # handle, and prefetch_to_device must be the last transformation in a
+    # pipeline, so device staging is deferred to prefetch_to_gpu
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def prefetch_to_gpu(ds):
+    """Stage batches in device memory so H2D copies overlap compute.
+
+    prefetch_to_device must be the final transformation, so apply this
+    only to a dataset that is consumed as-is by fit/predict — never to a
+    handle that still gets map/take applied downstream.
+    """
+    if tf.config.list_physical_devices('GPU'):
+        ds = ds.apply(tf.data.experimental.prefetch_to_device('/GPU:0', buffer_size=2))
+    return ds
+
+def create_feature_extractor():
+    """Create the frozen EfficientNetB0 feature extractor.
+
+    The backbone is fully frozen here, so its output for each image never
+    changes — running it once per image (instead of once per image per
+    epoch) eliminates nearly all of the per-epoch FLOPs.
+    """
+    print("Building feature extractor...")
+
     base_model = EfficientNetB0(
         weights='imagenet',
         include_top=False,
         input_shape=(IMG_SIZE, IMG_SIZE, 3)
     )
-    
-    # Freeze base model
     base_model.trainable = False
-    
-    # Add custom head
-    x = base_model.output
+
+    # Normalize on the GPU; the pipeline delivers uint8 batches
+    inputs = tf.keras.Input(shape=(IMG_SIZE, IMG_SIZE, 3))
+    x = tf.keras.layers.Rescaling(1. / 255)(inputs)
+    x = base_model(x)
     x = GlobalAveragePooling2D()(x)
-    x = Dense(128, activation='relu')(x)
-    x = Dropout(0.5)(x)
-    predictions = Dense(NUM_CLASSES, activation='softmax')(x)
-    
-    model = Model(inputs=base_model.input, outputs=predictions)
-    
-    # Compile model
+    return Model(inputs=inputs, outputs=x)
+
+def extract_features(extractor, ds, cache_name):
+    """Run the frozen backbone once over a split, caching features to disk.
+
+    The dataset must be unshuffled so features and labels line up across
+    the two passes.
+    """
+    cache_path = CACHE_DIR / f"{cache_name}_feats.npz"
+    if USE_CACHE and cache_path.exists():
+        cached = np.load(cache_path)
+        return cached['features'], cached['labels']
+
+    features = extractor.predict(prefetch_to_gpu(ds.map(lambda x, y: x)), verbose=1)
+    labels = np.concatenate([y.numpy() for _, y in ds])
+
+    if USE_CACHE:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        np.savez(cache_path, features=features, labels=labels)
+    return features, labels
+
+def create_head(feature_dim):
+    """Create the small trainable classification head."""
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(feature_dim,)),
+        Dense(128, activation='relu'),
+        Dropout(0.5),
+        # Keep softmax in FP32 so cross-entropy doesn't underflow in FP16
+        Dense(NUM_CLASSES, activation='softmax', dtype='float32'),
+    ])
+
+    # Compile model; dynamic loss scaling protects FP16 gradients
     model.compile(
-        optimizer=Adam(learning_rate=LEARNING_RATE),
-        loss='categorical_crossentropy',
-        metrics=['accuracy']
+        optimizer=mixed_precision.LossScaleOptimizer(Adam(learning_rate=LEARNING_RATE)),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=True  # XLA fuses the Conv/BN/ReLU chains into fewer kernels
     )
-    
+
     return model
 
 def main():
@@ -154,74 +209,100 @@ def main():
         print(f"Error: Training directory not found: {TRAIN_DIR}")
         return
     
-    # Load training data
-    print("Loading training data...")
-    X_train_full, y_train_full = load_dataset(TRAIN_DIR)
-    
-    if len(X_train_full) == 0:
-        print("Error: No training images loaded!")
+    # Collect training file paths
+    print("Listing training data...")
+    train_paths_full, train_labels_full = list_dataset_files(TRAIN_DIR)
+
+    if len(train_paths_full) == 0:
+        print("Error: No training images found!")
         return
-    
+
     # Split into train and validation
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_train_full, y_train_full, 
-        test_size=0.2, 
-        stratify=y_train_full, 
+    train_paths, val_paths, train_labels, val_labels = train_test_split(
+        train_paths_full, train_labels_full,
+        test_size=0.2,
+        stratify=train_labels_full,
         random_state=42
     )
-    
-    # Convert labels to categorical
-    y_train_cat = to_categorical(y_train, NUM_CLASSES)
-    y_val_cat = to_categorical(y_val, NUM_CLASSES)
-    
-    print(f"Training samples: {len(X_train)}")
-    print(f"Validation samples: {len(X_val)}")
-    
-    # Load test data
+
+    print(f"Training samples: {len(train_paths)}")
+    print(f"Validation samples: {len(val_paths)}")
+
+    # Unshuffled streaming datasets: features must stay aligned with
+    # labels across extraction passes; model.fit shuffles the features
+    train_ds = make_dataset(train_paths, train_labels, cache_name="train_224")
+    val_ds = make_dataset(val_paths, val_labels, cache_name="val_224")
+
     if TEST_DIR.exists():
-        print("Loading test data...")
-        X_test, y_test = load_dataset(TEST_DIR)
-        y_test_cat = to_categorical(y_test, NUM_CLASSES)
-        print(f"Test samples: {len(X_test)}")
+        test_paths, test_labels = list_dataset_files(TEST_DIR)
+        test_ds = make_dataset(test_paths, test_labels, cache_name="test_224")
+        print(f"Test samples: {len(test_paths)}")
     else:
-        X_test, y_test_cat = None, None
-    
-    # Create model
-    model = create_model()
-    print(f"Model created with {model.count_params():,} parameters")
-    
-    # Train model
+        test_ds = None
+
+    # Run the frozen backbone exactly once per split
+    extractor = create_feature_extractor()
+    print("Extracting bottleneck features...")
+    train_feats, y_train = extract_features(extractor, train_ds, "train")
+    val_feats, y_val = extract_features(extractor, val_ds, "val")
+
+    # Train only the head on cached features; each epoch now touches the
+    # small MLP instead of the 237-layer backbone
+    model = create_head(train_feats.shape[1])
+    print(f"Head created with {model.count_params():,} parameters")
+
     print(f"Starting training for {EPOCHS} epochs...")
-    
+
     history = model.fit(
-        X_train, y_train_cat,
+        train_feats, y_train,
         batch_size=BATCH_SIZE,
         epochs=EPOCHS,
-        validation_data=(X_val, y_val_cat),
+        validation_data=(val_feats, y_val),
         verbose=1
     )
-    
+
     print("Training completed!")
-    
+
     # Evaluate
-    if X_test is not None:
+    if test_ds is not None:
         print("Evaluating on test data...")
-        test_loss, test_accuracy = model.evaluate(X_test, y_test_cat, verbose=1)
+        test_feats, y_test = extract_features(extractor, test_ds, "test")
+        test_loss, test_accuracy = model.evaluate(test_feats, y_test, verbose=1)
         print(f"Test accuracy: {test_accuracy:.4f}")
     else:
         test_accuracy = 0
     
-    # Save model
+    # Save the composed end-to-end model (backbone + trained head) so
+    # downstream consumers still get an image-in, probabilities-out model
     model_dir = Path("ml_models/saved_models")
     model_dir.mkdir(parents=True, exist_ok=True)
-    model_path = model_dir / "face_shape_cnn.h5"
-    
-    model.save(str(model_path))
+    # Keras v3 format: protobuf-backed, faster than the legacy HDF5 path
+    model_path = model_dir / "face_shape_cnn.keras"
+
+    full_model = Model(extractor.input, model(extractor.output))
+    full_model.save(str(model_path))
     print(f"Model saved to: {model_path}")
+
+    # Int8 quantization for CPU serving: 4x smaller and 2-4x faster via
+    # VNNI/NEON int8 dot products; calibrated on real training batches
+    print("Exporting int8 TFLite model...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(full_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    def representative_dataset():
+        for images, _ in train_ds.take(100):
+            yield [tf.cast(images[:1], tf.float32)]
+
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    int8_path = model_dir / "face_shape_int8.tflite"
+    int8_path.write_bytes(converter.convert())
+    print(f"Int8 model saved to: {int8_path}")
     
     print("\nTraining Summary:")
     print(f"Final validation accuracy: {history.history['val_accuracy'][-1]:.4f}")
-    if X_test is not None:
+    if test_ds is not None:
         print(f"Final test accuracy: {test_accuracy:.4f}")
     
     if test_accuracy >= 0.7:
@@ -7,12 +7,24 @@ import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout, BatchNormalization
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
+from tensorflow.keras import mixed_precision
 from pathlib import Path
 import matplotlib.pyplot as plt
 
+# FP16 compute on Tensor Cores with FP32 master weights; ~1.5-2x faster
+# conv forward+backward and half the activation memory
+mixed_precision.set_global_policy('mixed_float16')
+
+# TF32 on Ampere+: FP32-range Tensor Core matmul/conv for any ops the
+# FP16 policy leaves in float32 (on by default, explicit for clarity)
+tf.config.experimental.enable_tensor_float_32_execution(True)
+
+# Allocate GPU memory incrementally instead of reserving it all at startup
+for _gpu in tf.config.list_physical_devices('GPU'):
+    tf.config.experimental.set_memory_growth(_gpu, True)
+
 # Configuration
 IMG_HEIGHT = 224
 IMG_WIDTH = 224
@@ -29,7 +41,16 @@ TEST_DIR = DATASET_ROOT / "testing_set"
 def create_model():
     """Create a simple CNN model."""
     model = Sequential([
-        Conv2D(32, (3, 3), activation='relu', input_shape=(IMG_HEIGHT, IMG_WIDTH, 3)),
+        tf.keras.Input(shape=(IMG_HEIGHT, IMG_WIDTH, 3)),
+        # GPU-side augmentation (inactive at inference); rescaling follows
+        # because image_dataset_from_directory yields 0-255 pixels
+        tf.keras.layers.RandomFlip('horizontal'),
+        tf.keras.layers.RandomRotation(0.1),
+        tf.keras.layers.RandomZoom(0.1),
+        tf.keras.layers.RandomBrightness(0.2),
+        tf.keras.layers.Rescaling(1. / 255),
+
+        Conv2D(32, (3, 3), activation='relu'),
         BatchNormalization(),
         MaxPooling2D(2, 2),
         
@@ -50,61 +71,70 @@ def create_model():
         Dropout(0.5),
         Dense(256, activation='relu'),
         Dropout(0.5),
-        Dense(NUM_CLASSES, activation='softmax')
+        # Keep softmax in FP32 so cross-entropy doesn't underflow in FP16
+        Dense(NUM_CLASSES, activation='softmax', dtype='float32')
     ])
-    
+
+    # Dynamic loss scaling protects FP16 gradients
     model.compile(
-        optimizer=Adam(learning_rate=0.001),
+        optimizer=mixed_precision.LossScaleOptimizer(Adam(learning_rate=0.001)),
         loss='categorical_crossentropy',
-        metrics=['accuracy']
+        metrics=['accuracy'],
+        jit_compile=True  # XLA fuses the Conv/BN/ReLU chains into fewer kernels
     )
     
     return model
 
+def tune_pipeline(ds):
+    """Relax ordering and enable fusion optimizations, then prefetch."""
+    opts = tf.data.Options()
+    opts.experimental_deterministic = False
+    opts.experimental_optimization.map_and_batch_fusion = True
+    opts.experimental_optimization.parallel_batch = True
+    ds = ds.with_options(opts).prefetch(tf.data.AUTOTUNE)
+    if tf.config.list_physical_devices('GPU'):
+        # Stage batches in device memory so H2D copies overlap compute;
+        # must be the last transformation in the pipeline
+        ds = ds.apply(tf.data.experimental.prefetch_to_device('/GPU:0', buffer_size=2))
+    return ds
+
 def create_data_generators():
-    """Create data generators for training and validation."""
-    
-    # Training data generator with augmentation
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=20,
-        width_shift_range=0.1,
-        height_shift_range=0.1,
-        horizontal_flip=True,
-        zoom_range=0.1,
-        brightness_range=[0.8, 1.2],
-        validation_split=0.2  # Use 20% for validation
-    )
-    
-    # Test data generator (no augmentation)
-    test_datagen = ImageDataGenerator(rescale=1./255)
-    
-    # Create generators
-    train_generator = train_datagen.flow_from_directory(
+    """Create tf.data datasets for training, validation and test.
+
+    image_dataset_from_directory decodes on a C++ threadpool, unlike the
+    single-threaded Python generators of ImageDataGenerator; augmentation
+    moved into the model as GPU-side preprocessing layers.
+    """
+    train_ds = tf.keras.utils.image_dataset_from_directory(
         TRAIN_DIR,
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
+        image_size=(IMG_HEIGHT, IMG_WIDTH),
         batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='training'
+        label_mode='categorical',
+        validation_split=0.2,  # Use 20% for validation
+        subset='training',
+        seed=42
     )
-    
-    val_generator = train_datagen.flow_from_directory(
+
+    val_ds = tf.keras.utils.image_dataset_from_directory(
         TRAIN_DIR,
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
+        image_size=(IMG_HEIGHT, IMG_WIDTH),
         batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='validation'
+        label_mode='categorical',
+        validation_split=0.2,
+        subset='validation',
+        seed=42
     )
-    
-    test_generator = test_datagen.flow_from_directory(
+
+    test_ds = tf.keras.utils.image_dataset_from_directory(
         TEST_DIR,
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
+        image_size=(IMG_HEIGHT, IMG_WIDTH),
         batch_size=BATCH_SIZE,
-        class_mode='categorical',
+        label_mode='categorical',
         shuffle=False
     )
-    
-    return train_generator, val_generator, test_generator
+
+    class_names = train_ds.class_names
+    return tune_pipeline(train_ds), tune_pipeline(val_ds), tune_pipeline(test_ds), class_names
 
 def plot_training_history(history, save_path):
     """Plot training history."""
@@ -150,14 +180,11 @@ def main():
     print(f"Training directory: {TRAIN_DIR}")
     print(f"Test directory: {TEST_DIR}")
     
-    # Create data generators
-    print("\nCreating data generators...")
-    train_gen, val_gen, test_gen = create_data_generators()
-    
-    print(f"Training samples: {train_gen.samples}")
-    print(f"Validation samples: {val_gen.samples}")
-    print(f"Test samples: {test_gen.samples}")
-    print(f"Classes: {list(train_gen.class_indices.keys())}")
+    # Create datasets
+    print("\nCreating datasets...")
+    train_ds, val_ds, test_ds, class_names = create_data_generators()
+
+    print(f"Classes: {class_names}")
     
     # Create model
     print("\nCreating model...")
@@ -173,7 +200,7 @@ def main():
             verbose=1
         ),
         ModelCheckpoint(
-            filepath='ml_models/saved_models/simple_face_shape_cnn.h5',
+            filepath='ml_models/saved_models/simple_face_shape_cnn.keras',
             monitor='val_accuracy',
             save_best_only=True,
             verbose=1
@@ -190,16 +217,16 @@ def main():
     # Train model
     print(f"\nStarting training for {EPOCHS} epochs...")
     history = model.fit(
-        train_gen,
+        train_ds,
         epochs=EPOCHS,
-        validation_data=val_gen,
+        validation_data=val_ds,
         callbacks=callbacks,
         verbose=1
     )
-    
+
     # Evaluate on test set
     print("\nEvaluating on test set...")
-    test_loss, test_accuracy = model.evaluate(test_gen, verbose=1)
+    test_loss, test_accuracy = model.evaluate(test_ds, verbose=1)
     
     print(f"\nFinal Results:")
     print(f"Test Accuracy: {test_accuracy:.4f}")
@@ -210,9 +237,22 @@ def main():
     else:
         print("⚠️ Target accuracy not reached. Need more training.")
     
+    # Export a BN-folded inference artifact: the TFLite converter folds
+    # each BatchNormalization into the preceding Conv2D's kernel/bias, so
+    # inference runs four fewer full-tensor kernels per forward pass
+    print("\nExporting BN-folded TFLite model...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    tflite_model = converter.convert()
+
+    tflite_path = Path('ml_models/saved_models/simple_face_shape_cnn.tflite')
+    tflite_path.parent.mkdir(parents=True, exist_ok=True)
+    tflite_path.write_bytes(tflite_model)
+    print(f"TFLite model saved to: {tflite_path}")
+
     # Save training history plot
     plot_training_history(history, 'training_history.png')
-    
+
     print("\nTraining complete!")
 
 if __name__ == "__main__":
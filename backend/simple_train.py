@@ -7,11 +7,23 @@ import sys
 import numpy as np
 from pathlib import Path
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import EfficientNetB0
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
+from tensorflow.keras import mixed_precision
+
+# FP16 compute on Tensor Cores with FP32 master weights; ~1.5-2x faster
+# conv forward+backward and half the activation memory
+mixed_precision.set_global_policy('mixed_float16')
+
+# TF32 on Ampere+: FP32-range Tensor Core matmul/conv for any ops the
+# FP16 policy leaves in float32 (on by default, explicit for clarity)
+tf.config.experimental.enable_tensor_float_32_execution(True)
+
+# Allocate GPU memory incrementally instead of reserving it all at startup
+for _gpu in tf.config.list_physical_devices('GPU'):
+    tf.config.experimental.set_memory_growth(_gpu, True)
 
 print("Starting simple face shape training...")
 print("TensorFlow version:", tf.__version__)
@@ -42,52 +54,77 @@ if not TEST_DIR.exists():
 
 print("Dataset directories found!")
 
-# Create data generators
-print("Creating data generators...")
-
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=20,
-    width_shift_range=0.1,
-    height_shift_range=0.1,
-    horizontal_flip=True,
-    validation_split=0.2
-)
-
-test_datagen = ImageDataGenerator(rescale=1./255)
+# Create datasets; tf.data decodes on a C++ threadpool instead of the
+# single-threaded Python generators ImageDataGenerator uses
+print("Creating datasets...")
+
+def tune_pipeline(ds):
+    """Relax ordering and enable fusion optimizations, then prefetch.
+
+    Host-side prefetch only: device staging lives in prefetch_to_gpu so a
+    host handle survives for the TFLite calibration take() below.
+    """
+    opts = tf.data.Options()
+    opts.experimental_deterministic = False
+    opts.experimental_optimization.map_and_batch_fusion = True
+    opts.experimental_optimization.parallel_batch = True
+    return ds.with_options(opts).prefetch(tf.data.AUTOTUNE)
+
+def prefetch_to_gpu(ds):
+    """Stage batches in device memory so H2D copies overlap compute.
+
+    prefetch_to_device must be the final transformation, so apply this
+    only to a dataset that is consumed as-is by fit/evaluate — never to a
+    handle that still gets map/take applied downstream.
+    """
+    if tf.config.list_physical_devices('GPU'):
+        ds = ds.apply(tf.data.experimental.prefetch_to_device('/GPU:0', buffer_size=2))
+    return ds
 
-# Load training data
 print("Loading training data...")
-train_generator = train_datagen.flow_from_directory(
+train_ds = tf.keras.utils.image_dataset_from_directory(
     TRAIN_DIR,
-    target_size=(IMG_SIZE, IMG_SIZE),
+    image_size=(IMG_SIZE, IMG_SIZE),
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='training'
+    label_mode='categorical',
+    validation_split=0.2,
+    subset='training',
+    seed=42
 )
 
-validation_generator = train_datagen.flow_from_directory(
+validation_ds = tf.keras.utils.image_dataset_from_directory(
     TRAIN_DIR,
-    target_size=(IMG_SIZE, IMG_SIZE),
+    image_size=(IMG_SIZE, IMG_SIZE),
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='validation'
+    label_mode='categorical',
+    validation_split=0.2,
+    subset='validation',
+    seed=42
 )
 
 # Load test data
 print("Loading test data...")
-test_generator = test_datagen.flow_from_directory(
+test_ds = tf.keras.utils.image_dataset_from_directory(
     TEST_DIR,
-    target_size=(IMG_SIZE, IMG_SIZE),
+    image_size=(IMG_SIZE, IMG_SIZE),
     batch_size=BATCH_SIZE,
-    class_mode='categorical',
+    label_mode='categorical',
     shuffle=False
 )
 
-print(f"Training samples: {train_generator.samples}")
-print(f"Validation samples: {validation_generator.samples}")
-print(f"Test samples: {test_generator.samples}")
-print(f"Classes: {train_generator.class_indices}")
+print(f"Classes: {train_ds.class_names}")
+
+train_ds = tune_pipeline(train_ds)
+validation_ds = tune_pipeline(validation_ds)
+test_ds = tune_pipeline(test_ds)
+
+# Keep a host-side handle for TFLite calibration before device staging:
+# take() after prefetch_to_device would fail at runtime on GPU machines
+calibration_ds = train_ds.take(100)
+
+train_ds = prefetch_to_gpu(train_ds)
+validation_ds = prefetch_to_gpu(validation_ds)
+test_ds = prefetch_to_gpu(test_ds)
 
 # Build model
 print("Building model...")
@@ -102,20 +139,35 @@ base_model = EfficientNetB0(
 # Freeze base model
 base_model.trainable = False
 
+# Augmentation runs on GPU inside the model (inactive at inference);
+# rescaling follows it because image_dataset_from_directory yields 0-255
+augmentation = tf.keras.Sequential([
+    tf.keras.layers.RandomFlip('horizontal'),
+    tf.keras.layers.RandomRotation(0.1),
+    tf.keras.layers.RandomZoom(0.1),
+    tf.keras.layers.RandomBrightness(0.2),
+], name='augmentation')
+
+inputs = tf.keras.Input(shape=(IMG_SIZE, IMG_SIZE, 3))
+x = augmentation(inputs)
+x = tf.keras.layers.Rescaling(1. / 255)(x)
+x = base_model(x)
+
 # Add custom head
-x = base_model.output
 x = GlobalAveragePooling2D()(x)
 x = Dense(128, activation='relu')(x)
 x = Dropout(0.5)(x)
-predictions = Dense(NUM_CLASSES, activation='softmax')(x)
+# Keep softmax in FP32 so cross-entropy doesn't underflow in FP16
+predictions = Dense(NUM_CLASSES, activation='softmax', dtype='float32')(x)
 
-model = Model(inputs=base_model.input, outputs=predictions)
+model = Model(inputs=inputs, outputs=predictions)
 
-# Compile model
+# Compile model; dynamic loss scaling protects FP16 gradients
 model.compile(
-    optimizer=Adam(learning_rate=LEARNING_RATE),
+    optimizer=mixed_precision.LossScaleOptimizer(Adam(learning_rate=LEARNING_RATE)),
     loss='categorical_crossentropy',
-    metrics=['accuracy']
+    metrics=['accuracy'],
+    jit_compile=True  # XLA fuses the Conv/BN/ReLU chains into fewer kernels
 )
 
 print("Model compiled successfully!")
@@ -125,9 +177,9 @@ print(f"Total parameters: {model.count_params():,}")
 print(f"Starting training for {EPOCHS} epochs...")
 
 history = model.fit(
-    train_generator,
+    train_ds,
     epochs=EPOCHS,
-    validation_data=validation_generator,
+    validation_data=validation_ds,
     verbose=1
 )
 
@@ -135,18 +187,36 @@ print("Training completed!")
 
 # Evaluate on test data
 print("Evaluating on test data...")
-test_loss, test_accuracy = model.evaluate(test_generator, verbose=1)
+test_loss, test_accuracy = model.evaluate(test_ds, verbose=1)
 
 print(f"Test accuracy: {test_accuracy:.4f}")
 
 # Save model
 model_dir = Path("ml_models/saved_models")
 model_dir.mkdir(parents=True, exist_ok=True)
-model_path = model_dir / "face_shape_cnn.h5"
+# Keras v3 format: protobuf-backed, faster than the legacy HDF5 path
+model_path = model_dir / "face_shape_cnn.keras"
 
 model.save(str(model_path))
 print(f"Model saved to: {model_path}")
 
+# Int8 quantization for CPU serving: 4x smaller and 2-4x faster via
+# VNNI/NEON int8 dot products; calibrated on real training batches
+print("Exporting int8 TFLite model...")
+converter = tf.lite.TFLiteConverter.from_keras_model(model)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+def representative_dataset():
+    for images, _ in calibration_ds:
+        yield [tf.cast(images[:1], tf.float32)]
+
+converter.representative_dataset = representative_dataset
+converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+converter.inference_input_type = tf.uint8
+int8_path = model_dir / "face_shape_int8.tflite"
+int8_path.write_bytes(converter.convert())
+print(f"Int8 model saved to: {int8_path}")
+
 print("Simple training completed successfully!")
 print(f"Final test accuracy: {test_accuracy:.4f}")
 
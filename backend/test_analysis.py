@@ -3,6 +3,7 @@ Simple test script to analyze a face image using our image_analysis module.
 """
 
 import os
+import shutil
 import sys
 from pathlib import Path
 import requests
@@ -19,13 +20,14 @@ def download_test_image(url, output_path):
             return True
             
         print(f"Downloading test image from {url} to {output_path}")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-                
+        with requests.get(url, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with open(output_path, 'wb') as f:
+                # copyfileobj streams 1MB chunks straight from urllib3
+                # instead of looping over 8KB pieces in Python
+                shutil.copyfileobj(response.raw, f, 1 << 20)
+
         print(f"Test image downloaded successfully")
         return True
     except Exception as e:
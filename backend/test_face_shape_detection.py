@@ -5,32 +5,49 @@ This module provides comprehensive testing for the face shape detection system.
 
 import unittest
 import os
-import cv2
-import numpy as np
 from typing import Dict, List, Tuple
 import tempfile
 from pathlib import Path
 
-# Import the modules to test
+# Import the modules to test. cv2/numpy load inside the same guard so a
+# session that is going to skip (deps missing) never pays for the heavy
+# shared libraries; the sibling modules go first since they are the
+# usual import failure.
 try:
     from face_shape_detector import FaceShapeDetector, classify_face_shape_advanced
     from face_shape_recommendations import FaceShapeRecommendations
     from image_analysis import classify_face_shape
+    import cv2
+    import numpy as np
     MODULES_AVAILABLE = True
 except ImportError as e:
     print(f"Could not import modules for testing: {e}")
     MODULES_AVAILABLE = False
 
+@unittest.skipUnless(MODULES_AVAILABLE, "Required modules not available")
 class TestFaceShapeDetection(unittest.TestCase):
     """Test cases for face shape detection accuracy."""
-    
+
+    # Synthetic faces depend only on (shape, size), so each template is
+    # drawn once per session and reused across tests
+    _TEMPLATE_CACHE: Dict[Tuple[str, Tuple[int, int]], "np.ndarray"] = {}
+
+
+    @classmethod
+    def setUpClass(cls):
+        """Load the detector and recommendations once for the whole class.
+
+        FaceShapeDetector construction loads CNN weights and MediaPipe,
+        which dominates fixture time; per-method setUp would pay that cost
+        once per test. The instances come from test_utils so they are
+        shared with the other test scripts in the same process.
+        """
+        from test_utils import get_detector, get_recommendations
+        cls.detector = get_detector()
+        cls.recommendations = get_recommendations()
+
     def setUp(self):
-        """Set up test fixtures."""
-        if not MODULES_AVAILABLE:
-            self.skipTest("Required modules not available")
-        
-        self.detector = FaceShapeDetector()
-        self.recommendations = FaceShapeRecommendations()
+        """Set up per-test fixtures."""
         self.temp_dir = tempfile.mkdtemp()
     
     def tearDown(self):
@@ -40,17 +57,21 @@ class TestFaceShapeDetection(unittest.TestCase):
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
     
-    def create_synthetic_face_image(self, face_shape: str, size: Tuple[int, int] = (400, 500)) -> str:
+    def create_synthetic_face_array(self, face_shape: str, size: Tuple[int, int] = (400, 500)) -> "np.ndarray":
         """
-        Create a synthetic face image for testing specific face shapes.
-        
+        Create a synthetic face image as a BGR ndarray for testing.
+
         Args:
             face_shape: The face shape to simulate
             size: Image size (width, height)
-            
+
         Returns:
-            Path to the created test image
+            The drawn image as a uint8 HWC ndarray
         """
+        cached = self._TEMPLATE_CACHE.get((face_shape, size))
+        if cached is not None:
+            return cached
+
         width, height = size
         image = np.ones((height, width, 3), dtype=np.uint8) * 255  # White background
         
@@ -111,9 +132,25 @@ class TestFaceShapeDetection(unittest.TestCase):
         # Mouth
         cv2.ellipse(image, (center_x, center_y+40), (15, 8), 0, 0, 180, (100, 100, 100), 2)
         
-        # Save the image
-        filename = os.path.join(self.temp_dir, f"test_{face_shape.lower()}.jpg")
-        cv2.imwrite(filename, image)
+        self._TEMPLATE_CACHE[(face_shape, size)] = image
+        return image
+
+    def create_synthetic_face_image(self, face_shape: str, size: Tuple[int, int] = (400, 500)) -> str:
+        """
+        Create a synthetic face image on disk for path-based tests.
+
+        Args:
+            face_shape: The face shape to simulate
+            size: Image size (width, height)
+
+        Returns:
+            Path to the created test image
+        """
+        image = self.create_synthetic_face_array(face_shape, size)
+        # Fast PNG: JPEG's DCT encode dominates the write, and nothing
+        # here needs lossy compression; OpenCV decodes by magic bytes
+        filename = os.path.join(self.temp_dir, f"test_{face_shape.lower()}.png")
+        cv2.imwrite(filename, image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
         return filename
     
     def test_face_shape_detection_accuracy(self):
@@ -122,13 +159,13 @@ class TestFaceShapeDetection(unittest.TestCase):
         
         results = {}
         for shape in face_shapes:
-            # Create test image
-            test_image = self.create_synthetic_face_image(shape)
-            
-            # Test advanced detection
-            detected_shape = classify_face_shape_advanced(test_image)
+            # Classify the drawn array directly on the shared detector:
+            # no JPEG encode/decode round-trip and no per-image detector
+            # construction
+            test_image = self.create_synthetic_face_array(shape)
+            detected_shape = self.detector.detect_face_shape(test_image)[0]
             results[shape] = detected_shape
-            
+
             print(f"Expected: {shape}, Detected: {detected_shape}")
         
         # Calculate accuracy
@@ -167,8 +204,7 @@ class TestFaceShapeDetection(unittest.TestCase):
         # Create a clear oval face
         test_image = self.create_synthetic_face_image("Oval")
         
-        detector = FaceShapeDetector()
-        result = detector.detect_face_shape(test_image)
+        result = self.detector.detect_face_shape(test_image)
         
         # Check that confidence is returned and is reasonable
         self.assertIn("confidence", result)
@@ -211,14 +247,27 @@ def run_face_shape_tests():
     if not MODULES_AVAILABLE:
         print("Required modules not available for testing")
         return False
-    
+
+    # The test methods are independent (shared state is the read-only
+    # detector singleton), so spread them across cores when pytest-xdist
+    # is installed; each worker process builds its own detector once
+    try:
+        import xdist  # noqa: F401 - presence check only
+        import subprocess
+        import sys
+        return subprocess.call(
+            [sys.executable, "-m", "pytest", "-n", "auto", __file__]
+        ) == 0
+    except ImportError:
+        pass
+
     # Create test suite
     suite = unittest.TestLoader().loadTestsFromTestCase(TestFaceShapeDetection)
-    
+
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
-    
+
     # Return success status
     return result.wasSuccessful()
 
@@ -3,20 +3,60 @@ Final validation test for the improved K-Beauty Analysis system.
 This test validates the complete end-to-end functionality.
 """
 
+import socket
 import sys
 import os
 import json
+import numpy as np
+
+# orjson serializes in native code; fall back to stdlib json if absent
+try:
+    import orjson
+
+    def _dump_json(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def _dump_json(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode()
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import time
 from typing import Dict, Any
 
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Shared fixtures: detector construction loads CNN weights and
+# MediaPipe, so it's paid once per process via test_utils
+from test_utils import get_detector as _get_detector
+from test_utils import get_recommendations as _get_recommendations
+
+# Keep-alive session for the HTTP probes: repeated requests reuse one
+# pooled TCP connection instead of paying setup per check
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=2))
+
+def _port_open(host, port, timeout=0.1):
+    """Cheap TCP probe so a down server fails in ~100ms instead of
+    stalling for the full HTTP timeout."""
+    sock = socket.socket()
+    sock.settimeout(timeout)
+    try:
+        sock.connect((host, port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
 def test_api_health():
     """Test that the API is running and healthy."""
+    if not _port_open("localhost", 8000):
+        print("❌ API Health Check: SKIPPED (port 8000 closed)")
+        return False
     try:
-        response = requests.get("http://localhost:8000/api/health", timeout=5)
+        response = _SESSION.get("http://localhost:8000/api/health", timeout=5)
         if response.status_code == 200:
             print("✅ API Health Check: PASSED")
             return True
@@ -30,13 +70,12 @@ def test_api_health():
 def test_face_shape_detection_modules():
     """Test that all face shape detection modules are working."""
     try:
-        from face_shape_detector import FaceShapeDetector, classify_face_shape_advanced
-        from face_shape_recommendations import FaceShapeRecommendations
+        from face_shape_detector import classify_face_shape_advanced
         from image_analysis import classify_face_shape
-        
-        # Test detector initialization
-        detector = FaceShapeDetector()
-        recommendations = FaceShapeRecommendations()
+
+        # Test detector initialization (shared instance, built once)
+        detector = _get_detector()
+        recommendations = _get_recommendations()
         
         # Test with non-existent file (should handle gracefully)
         result = detector.detect_face_shape("non_existent.jpg")
@@ -85,8 +124,12 @@ def test_api_integration():
 
 def test_frontend_accessibility():
     """Test that the frontend is accessible."""
+    if not _port_open("localhost", 3000):
+        print("❌ Frontend Accessibility: SKIPPED (port 3000 closed)")
+        return False
     try:
-        response = requests.get("http://localhost:3000", timeout=10)
+        # Only the status code matters here, so HEAD skips the body transfer
+        response = _SESSION.head("http://localhost:3000", timeout=10)
         if response.status_code == 200:
             print("✅ Frontend Accessibility: PASSED")
             return True
@@ -100,34 +143,41 @@ def test_frontend_accessibility():
 def test_recommendation_quality():
     """Test the quality and completeness of recommendations."""
     try:
-        from face_shape_recommendations import FaceShapeRecommendations
-        
-        recommendations = FaceShapeRecommendations()
+        recommendations = _get_recommendations()
         face_shapes = ["Oval", "Round", "Square", "Heart", "Diamond", "Oblong", "Triangle"]
-        
+
+        # One pass per shape: walk each recommendation tree once into a
+        # (complete, hairstyles, makeup, accessories) row, then aggregate
+        # all four metrics in a single sum instead of repeated dict dives
+        rows = []
+        for shape in face_shapes:
+            recs = recommendations.get_recommendations(shape)
+            hairstyles = recs.get("hairstyles", {})
+            recommended = hairstyles.get("recommended", [])
+
+            complete = (len(recs.get("description", "")) > 50 and
+                        len(recs.get("strengths", [])) >= 3 and
+                        len(recommended) >= 4 and
+                        len(hairstyles.get("avoid", [])) >= 2)
+
+            rows.append((
+                1 if complete else 0,
+                len(recommended),
+                sum(1 for v in recs.get("makeup", {}).values() if v),
+                sum(1 for v in recs.get("accessories", {}).values() if v),
+            ))
+
+        complete_count, hair_tips, makeup_tips, accessory_tips = (
+            np.array(rows).sum(axis=0)
+        )
         quality_metrics = {
             "total_shapes": len(face_shapes),
-            "complete_recommendations": 0,
-            "total_hairstyle_tips": 0,
-            "total_makeup_tips": 0,
-            "total_accessory_tips": 0,
+            "complete_recommendations": int(complete_count),
+            "total_hairstyle_tips": int(hair_tips),
+            "total_makeup_tips": int(makeup_tips),
+            "total_accessory_tips": int(accessory_tips),
         }
-        
-        for shape in face_shapes:
-            recs = recommendations.get_recommendations(shape)
-            
-            # Check completeness
-            if (len(recs.get("description", "")) > 50 and
-                len(recs.get("strengths", [])) >= 3 and
-                len(recs.get("hairstyles", {}).get("recommended", [])) >= 4 and
-                len(recs.get("hairstyles", {}).get("avoid", [])) >= 2):
-                quality_metrics["complete_recommendations"] += 1
-            
-            # Count tips
-            quality_metrics["total_hairstyle_tips"] += len(recs.get("hairstyles", {}).get("recommended", []))
-            quality_metrics["total_makeup_tips"] += len([v for v in recs.get("makeup", {}).values() if v])
-            quality_metrics["total_accessory_tips"] += len([v for v in recs.get("accessories", {}).values() if v])
-        
+
         # Quality thresholds
         completeness_rate = quality_metrics["complete_recommendations"] / quality_metrics["total_shapes"]
         avg_hairstyle_tips = quality_metrics["total_hairstyle_tips"] / quality_metrics["total_shapes"]
@@ -172,10 +222,8 @@ def test_error_handling():
 def generate_system_report():
     """Generate a comprehensive system report."""
     try:
-        from face_shape_recommendations import FaceShapeRecommendations
-        
-        recommendations = FaceShapeRecommendations()
-        
+        recommendations = _get_recommendations()
+
         report = {
             "system_status": "operational",
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -201,8 +249,8 @@ def generate_system_report():
         }
         
         # Save report
-        with open("system_report.json", "w") as f:
-            json.dump(report, f, indent=2)
+        with open("system_report.json", "wb") as f:
+            f.write(_dump_json(report))
         
         print("📋 System Report Generated: system_report.json")
         return True
@@ -216,20 +264,36 @@ def main():
     print("🎯 K-Beauty Analysis System - Final Validation")
     print("=" * 60)
     
-    tests = [
+    network_tests = [
         ("API Health Check", test_api_health),
+        ("Frontend Accessibility", test_frontend_accessibility),
+    ]
+    local_tests = [
         ("Face Shape Detection Modules", test_face_shape_detection_modules),
         ("API Integration", test_api_integration),
-        ("Frontend Accessibility", test_frontend_accessibility),
         ("Recommendation Quality", test_recommendation_quality),
         ("Error Handling", test_error_handling),
         ("System Report Generation", generate_system_report),
     ]
-    
+
     passed = 0
-    total = len(tests)
-    
-    for test_name, test_func in tests:
+    total = len(network_tests) + len(local_tests)
+
+    # The network probes are independent round-trips; running them
+    # together makes their wall time the slowest probe, not the sum
+    with ThreadPoolExecutor(max_workers=len(network_tests)) as executor:
+        futures = [(name, executor.submit(func)) for name, func in network_tests]
+        for test_name, future in futures:
+            print(f"\n🧪 {test_name}...")
+            try:
+                if future.result():
+                    passed += 1
+                else:
+                    print(f"   ⚠️  {test_name} needs attention")
+            except Exception as e:
+                print(f"   ❌ {test_name} failed with exception: {e}")
+
+    for test_name, test_func in local_tests:
         print(f"\n🧪 {test_name}...")
         try:
             if test_func():
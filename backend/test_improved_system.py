@@ -3,17 +3,69 @@ Comprehensive test for the improved K-Beauty Analysis system.
 Tests face shape detection accuracy and recommendations system.
 """
 
+import functools
 import sys
 import os
 import json
+import shutil
 import tempfile
-import cv2
-import numpy as np
+from pathlib import Path
+
+import pytest
 from typing import Dict, Any
 
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Rendered test faces are deterministic per (shape, size), so they are
+# cached in a stable directory and reused across runs; bump the version
+# suffix whenever the drawing code changes
+_IMG_CACHE_DIR = Path(tempfile.gettempdir()) / "chromalyze_test_imgs_v1"
+_IMG_CACHE_DIR.mkdir(exist_ok=True)
+
+@functools.lru_cache(maxsize=1)
+def _shape_polys():
+    """Origin-centered polygon templates for the non-elliptical shapes.
+
+    Built once and shifted to the face center with a single broadcast
+    add, instead of rebuilding the point lists on every call.
+    """
+    import numpy as np
+    return {
+        # Heart: wider forehead, narrow chin
+        "Heart": np.array([
+            [-140, -120],  # Left forehead
+            [140, -120],   # Right forehead
+            [100, 0],      # Right cheek
+            [40, 80],      # Right jaw
+            [0, 140],      # Chin point
+            [-40, 80],     # Left jaw
+            [-100, 0],     # Left cheek
+        ], np.int32),
+        # Diamond: narrow forehead and jaw, wide cheekbones
+        "Diamond": np.array([
+            [-60, -140],   # Top narrow
+            [60, -140],
+            [80, -80],     # Upper cheek
+            [140, 0],      # Wide cheekbones
+            [80, 80],      # Lower cheek
+            [60, 140],     # Bottom narrow
+            [-60, 140],
+            [-80, 80],     # Lower cheek
+            [-140, 0],     # Wide cheekbones
+            [-80, -80],    # Upper cheek
+        ], np.int32),
+        # Triangle: narrow forehead, wide jaw
+        "Triangle": np.array([
+            [-60, -140],   # Narrow forehead
+            [60, -140],
+            [80, -40],     # Cheek
+            [140, 100],    # Wide jaw
+            [-140, 100],
+            [-80, -40],    # Cheek
+        ], np.int32),
+    }
+
 def create_realistic_test_image(face_shape: str, filename: str) -> str:
     """
     Create a more realistic test image for face shape detection.
@@ -25,9 +77,21 @@ def create_realistic_test_image(face_shape: str, filename: str) -> str:
     Returns:
         Path to the created image
     """
-    # Create a larger, more realistic image
+    # cv2 and numpy only matter to the drawing path, so they load here
+    # rather than at module import; the recommendations and API tests
+    # skip the ~200ms OpenCV import entirely
+    import cv2
+    import numpy as np
+
+    # Serve from the cross-run cache when this shape was already drawn
     width, height = 600, 800
-    image = np.ones((height, width, 3), dtype=np.uint8) * 240  # Light gray background
+    cache_path = _IMG_CACHE_DIR / f"{face_shape}_{width}x{height}.png"
+    if cache_path.exists():
+        shutil.copyfile(cache_path, filename)
+        return filename
+
+    # Create a larger, more realistic image
+    image = np.full((height, width, 3), 240, dtype=np.uint8)  # Light gray background
     
     center_x, center_y = width // 2, height // 2 + 50
     
@@ -53,61 +117,30 @@ def create_realistic_test_image(face_shape: str, filename: str) -> str:
         cv2.circle(image, (center_x+130, center_y+130), 20, (240, 240, 240), -1)
         add_facial_features(image, center_x, center_y, "square")
         
-    elif face_shape == "Heart":
-        # Heart: wider forehead, narrow chin
-        points = np.array([
-            [center_x-140, center_y-120],  # Left forehead
-            [center_x+140, center_y-120],  # Right forehead
-            [center_x+100, center_y],      # Right cheek
-            [center_x+40, center_y+80],    # Right jaw
-            [center_x, center_y+140],      # Chin point
-            [center_x-40, center_y+80],    # Left jaw
-            [center_x-100, center_y],      # Left cheek
-        ], np.int32)
-        cv2.fillPoly(image, [points], (220, 200, 180))
-        add_facial_features(image, center_x, center_y, "heart")
-        
-    elif face_shape == "Diamond":
-        # Diamond: narrow forehead and jaw, wide cheekbones
-        points = np.array([
-            [center_x-60, center_y-140],   # Top narrow
-            [center_x+60, center_y-140],
-            [center_x+80, center_y-80],    # Upper cheek
-            [center_x+140, center_y],      # Wide cheekbones
-            [center_x+80, center_y+80],    # Lower cheek
-            [center_x+60, center_y+140],   # Bottom narrow
-            [center_x-60, center_y+140],
-            [center_x-80, center_y+80],    # Lower cheek
-            [center_x-140, center_y],      # Wide cheekbones
-            [center_x-80, center_y-80],    # Upper cheek
-        ], np.int32)
-        cv2.fillPoly(image, [points], (220, 200, 180))
-        add_facial_features(image, center_x, center_y, "diamond")
-        
     elif face_shape == "Oblong":
         # Oblong: longer than wide
         cv2.ellipse(image, (center_x, center_y), (100, 180), 0, 0, 360, (220, 200, 180), -1)
         add_facial_features(image, center_x, center_y, "oblong")
-        
-    elif face_shape == "Triangle":
-        # Triangle: narrow forehead, wide jaw
-        points = np.array([
-            [center_x-60, center_y-140],   # Narrow forehead
-            [center_x+60, center_y-140],
-            [center_x+80, center_y-40],    # Cheek
-            [center_x+140, center_y+100],  # Wide jaw
-            [center_x-140, center_y+100],
-            [center_x-80, center_y-40],    # Cheek
-        ], np.int32)
+
+    elif face_shape in ("Heart", "Diamond", "Triangle"):
+        # Polygonal shapes come from the precomputed template table,
+        # shifted to the face center in one broadcast add
+        points = _shape_polys()[face_shape] + np.array(
+            [center_x, center_y], np.int32
+        )
         cv2.fillPoly(image, [points], (220, 200, 180))
-        add_facial_features(image, center_x, center_y, "triangle")
+        add_facial_features(image, center_x, center_y, face_shape.lower())
     
-    # Save the image
-    cv2.imwrite(filename, image)
+    # Write once into the cache (cheap PNG compression), then copy to
+    # the requested filename
+    cv2.imwrite(str(cache_path), image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    shutil.copyfile(cache_path, filename)
     return filename
 
 def add_facial_features(image, center_x, center_y, face_type):
     """Add realistic facial features to the test image."""
+    import cv2
+
     # Eyes
     eye_y = center_y - 40
     cv2.ellipse(image, (center_x-40, eye_y), (12, 8), 0, 0, 360, (100, 80, 60), -1)
@@ -137,42 +170,61 @@ def add_facial_features(image, center_x, center_y, face_type):
         cv2.ellipse(image, (center_x-80, center_y-10), (15, 25), 0, 0, 360, (210, 190, 170), -1)
         cv2.ellipse(image, (center_x+80, center_y-10), (15, 25), 0, 0, 360, (210, 190, 170), -1)
 
+@pytest.mark.slow
+@pytest.mark.cv
 def test_face_shape_accuracy():
-    """Test the accuracy of the improved face shape detection."""
+    """Test the accuracy of the improved face shape detection.
+
+    Marked slow/cv: it renders images and loads the detection models,
+    so `pytest -m "not slow"` runs only the cheap recommendations and
+    API checks.
+    """
     print("🧪 Testing Face Shape Detection Accuracy...")
     
     try:
-        from face_shape_detector import classify_face_shape_advanced, get_face_shape_with_confidence
-        from image_analysis import classify_face_shape
-        
+        from test_utils import get_detector
+
         face_shapes = ["Oval", "Round", "Square", "Heart", "Diamond", "Oblong", "Triangle"]
         results = {}
         detailed_results = {}
-        
+
         temp_dir = tempfile.mkdtemp()
-        
+
+        # Render every test image up front, then classify them in one
+        # batched call: the detector decodes and preprocesses in parallel
+        # and runs a single forward pass instead of two full detection
+        # pipelines per shape
+        test_images = []
         for shape in face_shapes:
-            # Create test image
             test_image = os.path.join(temp_dir, f"test_{shape.lower()}.jpg")
             create_realistic_test_image(shape, test_image)
-            
-            # Test advanced detection
-            detected_shape = classify_face_shape_advanced(test_image)
-            detailed_result = get_face_shape_with_confidence(test_image)
-            
+            test_images.append(test_image)
+
+        detector = get_detector()
+        batch_results = detector.detect_face_shape_batch(test_images)
+
+        for shape, detailed_result in zip(face_shapes, batch_results):
+            # The batch result carries both the label and the confidence,
+            # so no second per-image detection pass is needed
+            detected_shape = detailed_result.get("face_shape", "Unknown")
+
             results[shape] = detected_shape
             detailed_results[shape] = detailed_result
-            
+
             print(f"  Expected: {shape:8} | Detected: {detected_shape:8} | Confidence: {detailed_result.get('confidence', 0):.2f}")
         
-        # Calculate accuracy
-        correct_predictions = sum(1 for expected, detected in results.items() if expected == detected)
-        accuracy = correct_predictions / len(face_shapes)
+        # Calculate accuracy by comparing label arrays directly; this
+        # scales unchanged if the synthetic set ever grows large
+        import numpy as np
+
+        expected = np.array(face_shapes)
+        detected = np.array([results[s] for s in face_shapes])
+        correct_predictions = int((expected == detected).sum())
+        accuracy = float((expected == detected).mean())
         
         print(f"\n📊 Overall Accuracy: {accuracy:.1%} ({correct_predictions}/{len(face_shapes)})")
         
         # Clean up
-        import shutil
         shutil.rmtree(temp_dir)
         
         return accuracy >= 0.5  # At least 50% accuracy expected
@@ -186,9 +238,9 @@ def test_recommendations_system():
     print("\n🎨 Testing Recommendations System...")
     
     try:
-        from face_shape_recommendations import FaceShapeRecommendations
-        
-        recommendations = FaceShapeRecommendations()
+        from test_utils import get_recommendations
+
+        recommendations = get_recommendations()
         face_shapes = ["Oval", "Round", "Square", "Heart", "Diamond", "Oblong", "Triangle"]
         
         for shape in face_shapes:
@@ -28,9 +28,11 @@ def test_imports():
 def test_recommendations():
     """Test the recommendations system."""
     try:
-        from face_shape_recommendations import FaceShapeRecommendations
-        
-        recommendations = FaceShapeRecommendations()
+        # Shared singleton: the template dict is built once per process
+        # no matter how many test scripts ask for it
+        from test_utils import get_recommendations
+
+        recommendations = get_recommendations()
         face_shapes = ["Oval", "Round", "Square", "Heart", "Diamond", "Oblong", "Triangle"]
         
         print("\n🧪 Testing recommendations for all face shapes:")
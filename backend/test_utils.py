@@ -0,0 +1,22 @@
+"""
+Shared fixtures for the test scripts.
+"""
+
+import functools
+
+@functools.lru_cache(maxsize=1)
+def get_detector():
+    """Build the FaceShapeDetector once per process and reuse it.
+
+    Construction loads the CNN weights and initializes MediaPipe, which
+    dominates test startup; every test script should go through this
+    instead of instantiating its own detector.
+    """
+    from face_shape_detector import FaceShapeDetector
+    return FaceShapeDetector()
+
+@functools.lru_cache(maxsize=1)
+def get_recommendations():
+    """Build FaceShapeRecommendations once per process and reuse it."""
+    from face_shape_recommendations import FaceShapeRecommendations
+    return FaceShapeRecommendations()